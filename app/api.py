@@ -1,14 +1,20 @@
 from fastapi import FastAPI, Depends, HTTPException, status as s
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
 from uuid import UUID
 import os
 
 from .routers import flow, webhook, user, status
 from .model import UserDB
-from .database import get_db
-from app.middlewares import LoadBalancerMiddleware, CeleryQueueMiddleware, init_rate_limiter
+from .database import get_async_db, pool_stats
+from .load_monitor import load_sampler, queue_poller
+from .dedup import message_dedup
+from .outbound import latency_snapshot, PRIORITIES
+from app.middlewares import (
+    AdmissionControlMiddleware, admission_limits, init_rate_limiter, close_rate_limiter
+)
 from app.middlewares import get_rate_limit
 
 # Configure logging
@@ -36,13 +42,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add load balancer
-app.add_middleware(LoadBalancerMiddleware)
-app.add_middleware(CeleryQueueMiddleware)
+# Shed load before any other work is done for the request
+app.add_middleware(AdmissionControlMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
     await init_rate_limiter()
+    load_sampler.start()
+    queue_poller.start()
+    message_dedup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await load_sampler.stop()
+    await queue_poller.stop()
+    await close_rate_limiter()
+    await message_dedup.stop()
 
 @app.get("/", dependencies=[Depends(get_rate_limit(50, 60))])
 def home():
@@ -54,12 +70,38 @@ def home():
         raise HTTPException(s.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
 
+@app.get("/metrics/db-pool", dependencies=[Depends(get_rate_limit(50, 60))])
+def db_pool_metrics():
+    """Checkout latency and saturation of this process' database pools."""
+    return {"pools": pool_stats()}
+
+
+@app.get("/metrics/load", dependencies=[Depends(get_rate_limit(50, 60))])
+def load_metrics():
+    """Load signals and per route class concurrency limits of the admission layer."""
+    return {
+        **load_sampler.snapshot(),
+        "queues": queue_poller.snapshot(),
+        "concurrency": {limit.name: limit.snapshot() for limit in admission_limits},
+    }
+
+
+@app.get("/metrics/outbound", dependencies=[Depends(get_rate_limit(50, 60))])
+def outbound_metrics():
+    """Queue latency and depth of outbound WhatsApp messages per priority."""
+    latency = latency_snapshot()
+    return {
+        priority: {**latency[priority], "queued": queue_poller.queued.get(priority)}
+        for priority in PRIORITIES
+    }
+
+
 @app.post("/confirma-login/{user_id}", dependencies=[Depends(get_rate_limit(50, 60))])
-def confirm_login(user_id: UUID, db: Annotated[Session, Depends(get_db)]):
+async def confirm_login(user_id: UUID, db: Annotated[AsyncSession, Depends(get_async_db)]):
     try:
         logger.info("Received confirm_login request")
         
-        user = db.query(UserDB).filter_by(id=user_id).first()
+        user = await db.scalar(select(UserDB).filter_by(id=user_id))
         if not user:
             logger.warning("User not found during confirm_login")
             raise HTTPException(
@@ -68,7 +110,7 @@ def confirm_login(user_id: UUID, db: Annotated[Session, Depends(get_db)]):
             )
         
         user.login_status = True
-        db.commit()
+        await db.commit()
         logger.info("User login status successfully updated")
         return {"status": "ok"}
 
@@ -77,12 +119,12 @@ def confirm_login(user_id: UUID, db: Annotated[Session, Depends(get_db)]):
         raise http_err
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error confirming login: {e}", exc_info=True)
         raise HTTPException(s.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error confirming login")
 
     finally:
-        db.close()
+        await db.close()
         logger.debug("Database session closed for confirm_login")
 
 
@@ -1,5 +1,6 @@
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 from .config import setting
 
 from app.logging_config import get_logger
@@ -24,6 +25,14 @@ try:
         accept_content=["json"],
         timezone="Africa/Lagos",
         enable_utc=False,
+        # Webhook replies get their own workers, never stuck behind browser tasks
+        task_routes={
+            "app.tasks.handle_webhook_message": {"queue": "webhooks"},
+            "app.outbound.send_message": {"queue": "messages_bulk"},
+        },
+        # A worker listening on several queues drains them in the order given
+        # to -Q (messages_high before messages_bulk) instead of round robin
+        broker_transport_options={"queue_order_strategy": "priority"},
         beat_schedule={
              "update-is-uploaded-status": {
                 "task": "app.tasks.update_is_uploaded",
@@ -33,6 +42,10 @@ try:
                 "task": "app.tasks.schedule_status_task",
                 "schedule": crontab(minute="*/15", hour="7-13"),  # from 7AM to 1PM every 15 minutes
             },
+            "collect-media-blobs": {
+                "task": "app.tasks.collect_media_blobs",
+                "schedule": crontab(hour=3, minute=30),  # nightly, outside the posting window
+            },
         },
     )
     logger.info("Celery configuration and beat schedule set successfully")
@@ -46,3 +59,11 @@ try:
 except Exception as e:
     logger.error(f"Failed to autodiscover tasks: {e}", exc_info=True)
     raise
+
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Each prefork child must open its own database connections."""
+    from app.database import reset_pool_after_fork
+
+    reset_pool_after_fork()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+
+import redis
+
+from .config import setting
+
+# ---------------- Logging ----------------
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# ---------------- Config ----------------
+# Drive keeps a resumable upload session alive for about a week
+UPLOAD_SESSION_TTL = 6 * 24 * 3600
+# Progress of a folder transfer only has to outlive the Celery retries
+TREE_CHECKPOINT_TTL = int(os.environ.get("TRANSFER_CHECKPOINT_TTL", 24 * 3600))
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Process-wide Redis client for checkpoints and counters (None if unavailable)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            try:
+                _client = redis.Redis.from_url(setting.redis_url, decode_responses=True)
+                _client_pid = os.getpid()
+            except Exception as e:
+                logger.warning(f"Transfer checkpoints disabled, Redis unavailable: {e}")
+                return None
+        return _client
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()
+
+
+# ---------------- Upload sessions ----------------
+def upload_session_key(file_path: str, folder_id=None) -> str:
+    """Identify one upload of one exact local file (same path, size and mtime)."""
+    stat = os.stat(file_path)
+    return "drive:upload-session:" + _digest(
+        os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, folder_id
+    )
+
+
+def get_upload_session(key: str):
+    try:
+        client = get_redis()
+        return client.get(key) if client else None
+    except redis.RedisError as e:
+        logger.warning(f"Could not read upload session {key}: {e}")
+        return None
+
+
+def save_upload_session(key: str, session_uri: str):
+    try:
+        client = get_redis()
+        if client:
+            client.set(key, session_uri, ex=UPLOAD_SESSION_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Could not save upload session {key}: {e}")
+
+
+def clear_upload_session(key: str):
+    try:
+        client = get_redis()
+        if client:
+            client.delete(key)
+    except redis.RedisError as e:
+        logger.warning(f"Could not clear upload session {key}: {e}")
+
+
+# ---------------- Folder transfers ----------------
+class TreeCheckpoint:
+    """
+    What a folder transfer already finished, kept in a Redis hash so that a
+    retried task (or a new worker after a crash) skips it.
+    Every Redis error degrades to "nothing done yet".
+    """
+
+    def __init__(self, kind: str, *identity):
+        self.key = f"drive:{kind}-tree:" + _digest(*identity)
+
+    def load(self) -> dict:
+        try:
+            client = get_redis()
+            return client.hgetall(self.key) if client else {}
+        except redis.RedisError as e:
+            logger.warning(f"Could not load checkpoint {self.key}: {e}")
+            return {}
+
+    def mark(self, field: str, value: str):
+        try:
+            client = get_redis()
+            if client:
+                pipe = client.pipeline()
+                pipe.hset(self.key, field, value)
+                pipe.expire(self.key, TREE_CHECKPOINT_TTL)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not update checkpoint {self.key}: {e}")
+
+    def clear(self):
+        try:
+            client = get_redis()
+            if client:
+                client.delete(self.key)
+        except redis.RedisError as e:
+            logger.warning(f"Could not clear checkpoint {self.key}: {e}")
@@ -0,0 +1,91 @@
+import math
+import time
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class GradientLimit:
+    """
+    Adaptive concurrency limit driven by observed latency (gradient algorithm).
+
+    `long_rtt` is a slow moving baseline of what an unloaded request costs,
+    `short_rtt` the latency right now. While they agree the limit grows by
+    about sqrt(limit) per update; once requests queue up and short_rtt rises
+    above the baseline the limit shrinks in proportion (never below half).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 20,
+        minimum: int = 1,
+        maximum: int = 500,
+        tolerance: float = 1.5,
+        samples_per_update: int = 10,
+    ):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.samples_per_update = samples_per_update
+        self.in_flight = 0
+        self.gradient = 1.0
+        self.long_rtt = None
+        self.short_rtt = None
+        self.rejected = 0
+        self._samples = []
+
+    @property
+    def congested(self) -> bool:
+        return self.gradient < 0.9
+
+    def try_acquire(self, limit: float | None = None) -> bool:
+        if self.in_flight >= int(limit if limit is not None else self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, started: float):
+        self.in_flight -= 1
+        self._samples.append(time.monotonic() - started)
+        if len(self._samples) >= self.samples_per_update:
+            self._update()
+
+    def _update(self):
+        short_rtt = sorted(self._samples)[len(self._samples) // 2]
+        self._samples.clear()
+
+        if self.long_rtt is None:
+            self.long_rtt = short_rtt
+        else:
+            self.long_rtt = 0.95 * self.long_rtt + 0.05 * short_rtt
+            # Recover the baseline quickly once the overload is gone
+            if short_rtt < self.long_rtt:
+                self.long_rtt = short_rtt
+        self.short_rtt = short_rtt
+
+        self.gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / short_rtt))
+        new_limit = self.limit * self.gradient + math.sqrt(self.limit)
+        new_limit = 0.8 * self.limit + 0.2 * new_limit
+        new_limit = max(self.minimum, min(self.maximum, new_limit))
+
+        if int(new_limit) != int(self.limit):
+            logger.info(
+                f"Concurrency limit {self.name}: {int(self.limit)} -> {int(new_limit)} "
+                f"(rtt {short_rtt * 1000:.0f}ms, baseline {self.long_rtt * 1000:.0f}ms)"
+            )
+        self.limit = new_limit
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "gradient": round(self.gradient, 2),
+            "rtt_ms": round(self.short_rtt * 1000, 1) if self.short_rtt else None,
+            "baseline_ms": round(self.long_rtt * 1000, 1) if self.long_rtt else None,
+            "rejected": self.rejected,
+        }
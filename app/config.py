@@ -16,6 +16,31 @@ class Settings(BaseSettings):
     app_secret: str
     google_scopes: str
     fernet_key: str
+    db_pool_profile: str = "api"
+    db_pool_timeout: int = 10
+    db_pool_recycle: int = 1800
+    storage_backend: str = "drive"
+    local_storage_root: str | None = None
+    load_sample_interval: float = 0.5
+    load_ewma_alpha: float = 0.3
+    load_shed_cpu: float = 90
+    load_resume_cpu: float = 75
+    load_shed_mem: float = 90
+    load_resume_mem: float = 80
+    load_shed_loop_lag_ms: float = 250
+    load_resume_loop_lag_ms: float = 100
+    celery_queues: str = "celery,webhooks,messages_high,messages_bulk"
+    queue_poll_interval: float = 2.0
+    queue_inspect_interval: float = 30.0
+    queue_backlog_limit: int = 500
+    rate_limit_sync_interval: float = 1.0
+    webhook_rate_limit: int = 30
+    flow_rate_limit: int = 60
+    webhook_dedup_ttl: int = 24 * 3600
+    whatsapp_send_rate: float = 20
+    whatsapp_send_burst: int = 20
+    whatsapp_send_concurrency: int = 8
+    whatsapp_send_retries: int = 4
 
     class Config:
         env_file = ".env"
@@ -32,12 +32,20 @@ except Exception as e:
     raise
 
 def encrypt_file(file_path: str, remove_original: bool = True) -> str:
-    """Stream-encrypt large files in chunks to avoid memory bottlenecks."""
+    """
+    Stream-encrypt large files in chunks to avoid memory bottlenecks.
+    The output is written to a temp file and renamed into place, so an existing
+    .enc is always complete (retries reuse it instead of re-encrypting).
+    """
     encrypted_path = file_path + ".enc"
+    tmp_path = encrypted_path + ".tmp"
     try:
-        with open(file_path, "rb") as infile, open(encrypted_path, "wb") as outfile:
+        with open(file_path, "rb") as infile, open(tmp_path, "wb") as outfile:
             while chunk := infile.read(10 * 1024 * 1024):  # 10 MB chunks
                 outfile.write(CIPHER.encrypt(chunk))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, encrypted_path)
 
         logger.info(f"File encrypted successfully -> {encrypted_path}")
         if remove_original:
@@ -47,6 +55,8 @@ def encrypt_file(file_path: str, remove_original: bool = True) -> str:
         return encrypted_path
     except Exception as e:
         logger.error(f"Error encrypting {file_path}: {e}", exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise
 
 def decrypt_file(encrypted_path: str, output_path: str = None, remove_original: bool = True) -> str:
@@ -1,7 +1,11 @@
+import threading
+import time
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .config import setting
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 
 from app.logging_config import get_logger
 
@@ -14,8 +18,133 @@ DATABASE_URL = (
     f"{setting.database_port}/{setting.database_name}"
 )
 
+# Same database through asyncpg, used by the FastAPI routers
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+
+
+# ---------------- Pool profiles ----------------
+# Set DB_POOL_PROFILE per process role. "api" is uvicorn, where requests go through
+# the async engine and the sync engine only serves Drive helpers called in handlers.
+# "worker" is a Celery prefork child: it runs one task at a time, so every child
+# keeps a tiny pool and never touches the async engine.
+POOL_PROFILES = {
+    "api": {
+        "sync": {"pool_size": 2, "max_overflow": 3},
+        "async": {"pool_size": 10, "max_overflow": 20},
+    },
+    "worker": {
+        "sync": {"pool_size": 1, "max_overflow": 2},
+        "async": None,
+    },
+}
+
+SATURATION_WARNING = 0.8
+SLOW_CHECKOUT_SECONDS = 0.5
+
+
+class PoolTelemetry:
+    """Checkout latency and saturation counters for one connection pool."""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+        self._saturated = False
+
+    def record(self, pool, wait: float, timed_out: bool = False):
+        in_use = pool.checkedout()
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                if wait >= SLOW_CHECKOUT_SECONDS:
+                    self.slow_checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            saturated = in_use >= self.capacity * SATURATION_WARNING
+            changed, self._saturated = saturated != self._saturated, saturated
+
+        if timed_out:
+            logger.error("%s pool checkout timed out after %.2fs (%s)", self.name, wait, pool.status())
+        elif changed and saturated:
+            logger.warning("%s pool saturated: %s/%s connections in use", self.name, in_use, self.capacity)
+        elif changed:
+            logger.info("%s pool recovered: %s/%s connections in use", self.name, in_use, self.capacity)
+
+    def snapshot(self, pool) -> dict:
+        in_use = pool.checkedout()
+        with self._lock:
+            return {
+                "pool": self.name,
+                "in_use": in_use,
+                "idle": pool.checkedin(),
+                "capacity": self.capacity,
+                "saturation": round(in_use / self.capacity, 3) if self.capacity else 0.0,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "slow_checkouts": self.slow_checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+def timed_pool(base, telemetry: PoolTelemetry):
+    """
+    Pool class that times every checkout. A class (not an instance hook) is used
+    because engine.dispose() rebuilds the pool from self.__class__.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = base._do_get(self)
+        except PoolTimeoutError:
+            telemetry.record(self, time.perf_counter() - start, timed_out=True)
+            raise
+        telemetry.record(self, time.perf_counter() - start)
+        return conn
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "telemetry": telemetry})
+
+
+def pool_options(kind: str, base):
+    """Engine keyword arguments for this process role."""
+    if setting.db_pool_profile not in POOL_PROFILES:
+        # Falling back would silently give a forked worker the api pool
+        raise ValueError(
+            f"Unknown DB_POOL_PROFILE {setting.db_pool_profile!r}, expected one of {sorted(POOL_PROFILES)}"
+        )
+    profile = POOL_PROFILES[setting.db_pool_profile][kind]
+    if profile is None:
+        return {"poolclass": NullPool}, None
+
+    telemetry = PoolTelemetry(
+        f"{setting.db_pool_profile}-{kind}", profile["pool_size"] + profile["max_overflow"]
+    )
+    return {
+        **profile,
+        "poolclass": timed_pool(base, telemetry),
+        "pool_pre_ping": True,
+        "pool_recycle": setting.db_pool_recycle,
+        "pool_timeout": setting.db_pool_timeout,
+        "pool_use_lifo": True,
+    }, telemetry
+
+
 try:
-    engine = create_engine(DATABASE_URL)
+    sync_pool_options, sync_pool_telemetry = pool_options("sync", QueuePool)
+    engine = create_engine(DATABASE_URL, **sync_pool_options)
     logger.info("Database engine created successfully")
 except SQLAlchemyError as e:
     logger.error("Failed to create engine: %s", e, exc_info=True)
@@ -49,4 +178,66 @@ def get_db():
     finally:
         if db is not None:
             db.close()
-            logger.debug("Database session closed")
\ No newline at end of file
+            logger.debug("Database session closed")
+
+
+# ---------------- Async (FastAPI routers) ----------------
+try:
+    async_pool_options, async_pool_telemetry = pool_options("async", AsyncAdaptedQueuePool)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_pool_options)
+    logger.info("Async database engine created successfully")
+except SQLAlchemyError as e:
+    logger.error("Failed to create async engine: %s", e, exc_info=True)
+    raise
+except Exception as e:
+    logger.error("Unexpected error creating async engine: %s", e, exc_info=True)
+    raise
+
+try:
+    # expire_on_commit=False: attributes must stay readable after commit,
+    # lazy loads are not possible outside the greenlet once the response is built
+    asyncSessionLocal = async_sessionmaker(
+        bind=async_engine, class_=AsyncSession,
+        autoflush=False, expire_on_commit=False
+    )
+    logger.info("AsyncSessionLocal created successfully")
+except Exception as e:
+    logger.error("Error creating async sessionmaker: %s", e, exc_info=True)
+    raise
+
+
+async def get_async_db():
+    """Async dependency for FastAPI routers"""
+    async with asyncSessionLocal() as db:
+        try:
+            logger.debug("Async database session opened")
+            yield db
+        except SQLAlchemyError as e:
+            logger.error("Database error in get_async_db: %s", e, exc_info=True)
+            raise
+        except Exception as e:
+            logger.error("Unexpected error in get_async_db: %s", e, exc_info=True)
+            raise
+        finally:
+            logger.debug("Async database session closed")
+
+
+def reset_pool_after_fork():
+    """
+    Drop connections inherited from the parent process without closing them,
+    the parent still owns those sockets. Called from Celery's worker_process_init.
+    """
+    engine.dispose(close=False)
+    if sync_pool_telemetry:
+        sync_pool_telemetry.reset()
+    logger.info("Database pool reset after fork")
+
+
+def pool_stats() -> list[dict]:
+    """Current telemetry of every pooled engine in this process."""
+    stats = []
+    if sync_pool_telemetry:
+        stats.append(sync_pool_telemetry.snapshot(engine.pool))
+    if async_pool_telemetry:
+        stats.append(async_pool_telemetry.snapshot(async_engine.sync_engine.pool))
+    return stats
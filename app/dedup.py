@@ -0,0 +1,75 @@
+import threading
+
+from cachetools import LRUCache
+from redis import asyncio as aioredis
+
+from .config import setting
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class MessageDeduplicator:
+    """
+    Drops webhook redeliveries by WhatsApp message id.
+    An in-process LRU answers repeats seen by this worker without I/O; Redis
+    SET NX with a TTL makes the first delivery win across all workers.
+    If Redis is unreachable, messages are let through (at-least-once).
+    A claim is released again when the message could not be accepted, so
+    Meta's redelivery of it is not dropped.
+    """
+
+    def __init__(self, ttl: int = setting.webhook_dedup_ttl, local_size: int = 100_000):
+        self.ttl = ttl
+        self._seen = LRUCache(maxsize=local_size)
+        self._lock = threading.Lock()
+        self._redis = None
+
+    def start(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(setting.redis_url, encoding="utf-8", decode_responses=True)
+
+    async def stop(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def first_seen(self, message_ids: list[str]) -> set[str]:
+        """The ids of this delivery that were never processed before."""
+        with self._lock:
+            fresh = []
+            for message_id in dict.fromkeys(message_ids):
+                if message_id and message_id not in self._seen:
+                    self._seen[message_id] = True
+                    fresh.append(message_id)
+        if not fresh or self._redis is None:
+            return set(fresh)
+
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for message_id in fresh:
+                pipe.set(f"webhook:msg:{message_id}", 1, nx=True, ex=self.ttl)
+            claimed = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Webhook dedup unavailable, accepting delivery: {e}")
+            return set(fresh)
+        return {message_id for message_id, won in zip(fresh, claimed) if won}
+
+    async def release(self, message_ids):
+        """Forget ids claimed by first_seen that were not processed after all."""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return
+        with self._lock:
+            for message_id in message_ids:
+                self._seen.pop(message_id, None)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.delete(*(f"webhook:msg:{message_id}" for message_id in message_ids))
+        except Exception as e:
+            logger.warning(f"Could not release webhook dedup claims {message_ids}: {e}")
+
+
+message_dedup = MessageDeduplicator()
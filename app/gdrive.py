@@ -1,21 +1,29 @@
 import os
+import json
 import tempfile
 import mimetypes
 import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import time
 import humanize
 import socket
+from concurrent.futures import ThreadPoolExecutor, wait
 
+import httplib2
+from cachetools import TTLCache
+from google_auth_httplib2 import AuthorizedHttp
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 
 from .config import setting
 from .crypto import encrypt_file, decrypt_file
+from .checkpoints import (
+    upload_session_key, get_upload_session, save_upload_session, clear_upload_session
+)
 
 # ---------------- Logging ----------------
 from app.logging_config import get_logger
@@ -49,51 +57,127 @@ if token_json and not os.path.exists(TOKEN_FILE):
 UPLOAD_THRESHOLD = 10 * 1024 * 1024
 MAX_WORKERS = 5
 
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# Folder listings: full pagination, only the fields we use, cached per folder
+LIST_PAGE_SIZE = 1000
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, md5Checksum, size, modifiedTime)"
+LIST_CACHE_TTL = int(os.environ.get("DRIVE_LIST_CACHE_TTL", 60))  # seconds
+
+# Downloads are fetched as ranged GETs of this size into a resumable .part file
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Large objects are split into concurrent Range segments (one per ~SEGMENT_SIZE)
+PARALLEL_DOWNLOAD_THRESHOLD = int(os.environ.get("DRIVE_PARALLEL_DOWNLOAD_THRESHOLD", 32 * 1024 * 1024))
+SEGMENT_SIZE = 16 * 1024 * 1024
+MAX_SEGMENTS = int(os.environ.get("DRIVE_MAX_SEGMENTS", 8))
+
+# Drive accepts at most 100 calls per batch request
+BATCH_DELETE_SIZE = 100
+
 # Extend global socket timeout (important for large files)
-socket.setdefaulttimeout(300)  # 5 minute
+HTTP_TIMEOUT = 300  # 5 minute
+socket.setdefaulttimeout(HTTP_TIMEOUT)
 
 
 # ---------------- Auth ----------------
-def get_drive_service():
-    """Authenticate and return Google Drive API service."""
-    creds = None
-    try:
-        if os.path.exists(TOKEN_FILE):
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+_credentials = None
+_credentials_lock = threading.RLock()
+_local = threading.local()
 
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-                logger.info("Refreshed expired credentials")
-            else:
+_list_cache = TTLCache(maxsize=1024, ttl=LIST_CACHE_TTL)
+_list_cache_lock = threading.Lock()
+
+# Segments get their own pool: download_file itself runs on the transfer pool
+_segment_pool = None
+_segment_pool_pid = None
+_segment_pool_lock = threading.Lock()
+
+
+def _save_credentials(creds):
+    with open(TOKEN_FILE, "w") as token:
+        token.write(creds.to_json())
+        logger.info("Saved refreshed credentials")
+
+
+class SharedCredentials(Credentials):
+    """
+    One credential shared by every thread of the process.
+    Refreshes are serialized, and a thread that waited on the lock reuses
+    the token another thread just fetched instead of refreshing again.
+    """
+
+    def refresh(self, request):
+        stale_token = self.token
+        with _credentials_lock:
+            if self.valid and self.token != stale_token:
+                return
+            super().refresh(request)
+            logger.info("Refreshed expired credentials")
+            _save_credentials(self)
+
+
+def get_credentials():
+    """Load (once per process) and return valid Google Drive credentials."""
+    global _credentials
+    with _credentials_lock:
+        try:
+            if _credentials is None and os.path.exists(TOKEN_FILE):
+                _credentials = SharedCredentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+
+            if _credentials is None or not (_credentials.valid or _credentials.refresh_token):
                 flow = InstalledAppFlow.from_client_secrets_file(
                     CREDENTIALS_FILE, SCOPES
                 )
                 creds = flow.run_local_server(port=0)
                 logger.info("New login via OAuth flow")
+                _credentials = SharedCredentials.from_authorized_user_info(
+                    json.loads(creds.to_json()), SCOPES
+                )
+                _save_credentials(_credentials)
+
+            if not _credentials.valid:
+                _credentials.refresh(Request())
 
-            with open(TOKEN_FILE, "w") as token:
-                token.write(creds.to_json())
-                logger.info("Saved refreshed credentials")
+            return _credentials
+
+        except Exception as e:
+            logger.error(f"Failed to authenticate with Google Drive: {e}")
+            raise
 
-        return build("drive", "v3", credentials=creds, cache_discovery=False)
 
+def get_drive_service():
+    """
+    Return the Google Drive API service of the calling thread.
+    Service objects and their httplib2 connections are not thread-safe, so each
+    thread builds one once and reuses it. The pid check drops clients inherited
+    through a Celery prefork.
+    """
+    service = getattr(_local, "service", None)
+    if service is not None and _local.pid == os.getpid():
+        return service
+
+    try:
+        http = AuthorizedHttp(get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        service = build("drive", "v3", http=http, cache_discovery=False)
     except Exception as e:
-        logger.error(f"Failed to authenticate with Google Drive: {e}")
+        logger.error(f"Failed to build Google Drive service: {e}")
         raise
 
-if get_drive_service():
-    logger.info("Google is working")
-
+    _local.service, _local.pid = service, os.getpid()
+    return service
 
 # ---------------- Upload ----------------
 def upload_file(file_path: str, folder_id=None):
     """Upload a file (encrypted first) to Google Drive safely and cleanly."""
     service = get_drive_service()
 
-    # Encrypt file if needed
+    # Encrypt file if needed (a retried upload finds it already encrypted)
     if not file_path.endswith(".enc"):
-        file_path = encrypt_file(file_path)
+        if not os.path.exists(file_path) and os.path.exists(file_path + ".enc"):
+            file_path += ".enc"
+        else:
+            file_path = encrypt_file(file_path)
 
     file_metadata = {"name": os.path.basename(file_path)}
     if folder_id:
@@ -116,16 +200,9 @@ def upload_file(file_path: str, folder_id=None):
                 ).execute()
             else:
                 media = MediaIoBaseUpload(f, mimetype=mime_type, resumable=True, chunksize=20 * 1024 * 1024)
-                request = service.files().create(
-                    body=file_metadata, media_body=media, fields="id, name"
-                )
-                response = None
-                while response is None:
-                    status, response = request.next_chunk()
-                    if status:
-                        logger.info(f"Progress: {int(status.progress() * 100)}%")
-                uploaded = response
+                uploaded = _resumable_upload(service, file_path, file_metadata, media, folder_id)
 
+        invalidate_folder_cache(folder_id)
         logger.info(f" Uploaded file: {uploaded['name']} (id={uploaded['id']})")
         return uploaded
 
@@ -134,14 +211,107 @@ def upload_file(file_path: str, folder_id=None):
         raise
 
 
-def upload_zip_file(local_folder, output_zip_base=None, parent_folder_id=None):
-    """Zip, encrypt, upload a folder, then clean up local files."""
+def _committed_offset(request, session_uri, file_size):
+    """
+    Ask Drive how much of a resumable session it holds: an empty PUT with
+    Content-Range "bytes */<size>". Returns (offset, None) while incomplete,
+    (None, file) when the upload already finished, (None, None) when expired.
+    """
+    resp, content = request.http.request(
+        session_uri, method="PUT", body="",
+        headers={"Content-Range": f"bytes */{file_size}", "Content-Length": "0"},
+    )
+    if resp.status == 308:
+        committed = resp.get("range")  # "bytes=0-<last byte>", absent when nothing is stored
+        return (int(committed.rsplit("-", 1)[1]) + 1 if committed else 0), None
+    if resp.status in (200, 201):
+        return None, json.loads(content)
+    if resp.status in (404, 410):
+        return None, None
+    raise HttpError(resp, content, uri=session_uri)
+
+
+def _resumable_upload(service, file_path, file_metadata, media, folder_id):
+    """
+    Chunked upload whose session URI is kept in Redis.
+    A retry of the same file asks Drive how many bytes it already holds and
+    continues from there instead of sending the whole file again.
+    """
+    session_key = upload_session_key(file_path, folder_id)
+    session_uri = get_upload_session(session_key)
+
+    request = service.files().create(body=file_metadata, media_body=media, fields="id, name")
+    if session_uri:
+        offset, finished = _committed_offset(request, session_uri, os.path.getsize(file_path))
+        if finished is not None:
+            logger.info(f"Upload of {os.path.basename(file_path)} already completed")
+            clear_upload_session(session_key)
+            return finished
+        if offset is None:
+            logger.warning(f"Upload session expired for {os.path.basename(file_path)}, restarting")
+            clear_upload_session(session_key)
+            session_uri = None
+        else:
+            logger.info(f"Resuming upload of {os.path.basename(file_path)} at byte {offset}")
+            request.resumable_uri = session_uri
+            request.resumable_progress = offset
+
+    response = None
+    while response is None:
+        try:
+            status, response = request.next_chunk()
+        except HttpError as e:
+            if session_uri and e.resp.status in (404, 410):
+                logger.warning(f"Upload session expired for {os.path.basename(file_path)}, restarting")
+                clear_upload_session(session_key)
+                session_uri = None
+                request = service.files().create(body=file_metadata, media_body=media, fields="id, name")
+                continue
+            raise
+
+        if request.resumable_uri and request.resumable_uri != session_uri:
+            session_uri = request.resumable_uri
+            save_upload_session(session_key, session_uri)
+        if status:
+            logger.info(f"Progress: {int(status.progress() * 100)}%")
+
+    clear_upload_session(session_key)
+    return response
+
+
+def _newest_mtime(folder):
+    newest = os.path.getmtime(folder)
+    for root, _, names in os.walk(folder):
+        for name in names:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                continue
+    return newest
+
+
+def prepare_archive(local_folder, output_zip_base=None):
+    """Zip a folder for upload and return the archive path."""
     if not output_zip_base:
         folder_name = os.path.basename(os.path.normpath(local_folder))
         parent_dir = os.path.dirname(os.path.normpath(local_folder))
         output_zip_base = os.path.join(parent_dir, folder_name + "_backup")
 
-    zip_file = zip_local_folder(local_folder, output_zip_base)
+    # An archive left by an interrupted attempt is reused when the folder has not
+    # changed since: re-encrypting would give new bytes and void the upload session.
+    # encrypt_file renames the .enc into place, so a half-written one never exists
+    encrypted_zip = output_zip_base + ".zip.enc"
+    if os.path.exists(encrypted_zip) and os.path.getmtime(encrypted_zip) >= _newest_mtime(local_folder):
+        logger.info(f"Reusing archive from previous attempt: {encrypted_zip}")
+        zip_file = encrypted_zip
+    else:
+        zip_file = zip_local_folder(local_folder, output_zip_base)
+    return zip_file
+
+
+def upload_zip_file(local_folder, output_zip_base=None, parent_folder_id=None):
+    """Zip, encrypt, upload a folder, then clean up local files."""
+    zip_file = prepare_archive(local_folder, output_zip_base)
 
     try:
         uploaded_file = upload_file(zip_file, parent_folder_id)
@@ -153,155 +323,226 @@ def upload_zip_file(local_folder, output_zip_base=None, parent_folder_id=None):
         logger.error(f"Failed to upload zipped folder {local_folder}: {e}")
         raise
 
-def upload_folder(folder_path, parent_folder_id=None):
-    """Recursively upload a folder to Google Drive.
-    Deletes the folder ONLY if every upload is successful."""
+def create_folder(name: str, parent_folder_id=None):
+    """Create an empty Drive folder and return its metadata (id, name)."""
     service = get_drive_service()
+    folder_metadata = {
+        "name": name,
+        "mimeType": FOLDER_MIME_TYPE,
+    }
+    if parent_folder_id:
+        folder_metadata["parents"] = [parent_folder_id]
 
-    folder_name = os.path.basename(folder_path)
-    prev_folder_name = folder_name
-    if folder_name.endswith("_uploading"):
-        folder_name = folder_name[:-10]
+    folder = service.files().create(body=folder_metadata, fields="id, name").execute()
+    invalidate_folder_cache(parent_folder_id)
+    logger.info(f"Created Drive folder: {name} (id={folder['id']})")
+    return folder
 
-    uploaded_successfully = True  # track success state
 
+# ---------------- Download ----------------
+
+def get_segment_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for the Range segments of large downloads."""
+    global _segment_pool, _segment_pool_pid
+    with _segment_pool_lock:
+        if _segment_pool is None or _segment_pool_pid != os.getpid():
+            _segment_pool = ThreadPoolExecutor(max_workers=MAX_SEGMENTS, thread_name_prefix="drive-segment")
+            _segment_pool_pid = os.getpid()
+        return _segment_pool
+
+
+def plan_segments(file_size):
+    """[start, end, written] per segment; more segments for bigger objects."""
+    if file_size < PARALLEL_DOWNLOAD_THRESHOLD:
+        count = 1
+    else:
+        count = max(2, min(MAX_SEGMENTS, file_size // SEGMENT_SIZE))
+    step = max(1, -(-file_size // count))
+    return [
+        [start, min(start + step, file_size) - 1, 0]
+        for start in range(0, file_size, step)
+    ]
+
+
+def _load_segments(state_path, state):
+    """Segments of a previous attempt on the same object, or None."""
     try:
-        # --- Create Drive folder ---
-        folder_metadata = {
-            "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-        if parent_folder_id:
-            folder_metadata["parents"] = [parent_folder_id]
-
-        folder = service.files().create(body=folder_metadata, fields="id, name").execute()
-        folder_id = folder["id"]
-        logger.info(f"Created Drive folder: {folder_name} (id={folder_id})")
-
-        # --- Collect items ---
-        items = os.listdir(folder_path)
-        file_tasks, subfolders = [], []
-
-        for item in items:
-            item_path = os.path.join(folder_path, item)
-            if os.path.isfile(item_path):
-                file_tasks.append(item_path)
-            elif os.path.basename(item_path).lower() == "profiles":
-                file_tasks.append(item_path)
-            elif os.path.isdir(item_path):
-                subfolders.append(item_path)
-
-        total_items = len(file_tasks) + len(subfolders)
-        completed = 0
-        futures = []
-
-        # --- Upload files concurrently ---
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for file_path in file_tasks:
-                if os.path.basename(file_path).lower() == "profiles":
-                    futures.append(executor.submit(upload_zip_file, file_path, parent_folder_id=folder_id))
-                else:
-                    futures.append(executor.submit(upload_file, file_path, folder_id))
-
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                    completed += 1
-                    percent = (completed / total_items) * 100
-                    logger.info(f"Uploaded file ({completed}/{total_items}) - {percent:.1f}% complete")
-                except Exception as e:
-                    uploaded_successfully = False
-                    logger.error(f" File upload error: {e}")
-
-        # --- Upload subfolders recursively ---
-        for subfolder in subfolders:
-            try:
-                upload_folder(subfolder, folder_id)
-                completed += 1
-                percent = (completed / total_items) * 100
-                logger.info(f"Uploaded folder ({completed}/{total_items}) - {percent:.1f}% complete")
-            except Exception as e:
-                uploaded_successfully = False
-                logger.error(f" Subfolder upload error: {e}")
-
-        # --- Delete only if EVERYTHING succeeded ---
-        if uploaded_successfully:
+        with open(state_path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get("object") != state:
+        return None
+    return saved.get("segments")
+
+
+class _DownloadState:
+    """Segment progress of one download, persisted to the sidecar after every chunk."""
+
+    def __init__(self, state_path, state, segments, readable_size):
+        self.state_path = state_path
+        self.state = state
+        self.segments = segments
+        self.readable_size = readable_size
+        self.size = state["size"]
+        self.started = time.time()
+        self.start_bytes = self.done()
+        self.last_percent = 0
+        self._lock = threading.Lock()
+
+    def done(self):
+        return sum(written for _, _, written in self.segments)
+
+    def save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"object": self.state, "segments": self.segments}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def advance(self, index, nbytes):
+        with self._lock:
+            self.segments[index][2] += nbytes
+            self.save()
+            downloaded = self.done()
+            percent = int(downloaded / self.size * 100)
+            if percent - self.last_percent >= 5 or percent == 100:
+                elapsed = time.time() - self.started
+                speed = (downloaded - self.start_bytes) / elapsed if elapsed else 0
+                logger.info(
+                    f"{percent}% ({humanize.naturalsize(downloaded)} / {self.readable_size}) "
+                    f"at {humanize.naturalsize(speed)}/s"
+                )
+                self.last_percent = percent
+
+
+def _download_segment(file_id, part_path, progress, index, max_retries):
+    """Fetch one [start, end] byte range in ranged GETs, writing it in place."""
+    # Every thread talks through its own client: httplib2 is not thread-safe
+    request = get_drive_service().files().get_media(fileId=file_id)
+    start, end, written = progress.segments[index]
+
+    with open(part_path, "r+b") as fh:
+        retries = 0
+        offset = start + written
+        while offset <= end:
+            chunk_end = min(offset + DOWNLOAD_CHUNK_SIZE - 1, end)
+            headers = dict(request.headers, range=f"bytes={offset}-{chunk_end}")
             try:
-                logger.info(f" All uploads successful. Deleting {folder_path}")
-                time.sleep(1)
-                shutil.rmtree(prev_folder_name)
-                logger.info(f" Deleted local folder: {prev_folder_name}")
-            except Exception as cleanup_error:
-                logger.warning(f" Could not delete folder {prev_folder_name}: {cleanup_error}")
-        else:
-            logger.warning(f" Upload incomplete. Keeping folder {folder_path} for retry.")
+                resp, content = request.http.request(request.uri, method="GET", headers=headers)
+            except (TimeoutError, socket.timeout, ConnectionError) as e:
+                retries += 1
+                if retries > max_retries:
+                    logger.error(f"Download failed after {max_retries} retries: {e}")
+                    raise
+                logger.warning(f"Timeout occurred (attempt {retries}/{max_retries}), retrying after 5s...")
+                time.sleep(5)
+                continue
+
+            whole_object = offset == 0 and chunk_end == progress.size - 1
+            if resp.status not in (200, 206) or (resp.status == 200 and not whole_object):
+                raise HttpError(resp, content, uri=request.uri)
+
+            fh.seek(offset)
+            fh.write(content[:chunk_end - offset + 1])
+            fh.flush()
+            retries = 0
+            written_now = min(len(content), chunk_end - offset + 1)
+            offset += written_now
+            progress.advance(index, written_now)
 
-        return folder
 
-    except Exception as e:
-        logger.error(f" Failed to upload folder {prev_folder_name}: {e}", exc_info=True)
-        raise
+def _download_segments(file_id, part_path, progress, pending, max_retries):
+    """
+    Fetch the pending segments on the segment pool. Every extra connection is
+    charged to the transfer limiter: the download already holds one slot, the
+    others are whatever slots are free right now. A failure stops the workers
+    from taking new segments and is raised only once every worker has exited,
+    so nothing writes to the .part file or its sidecar afterwards.
+    """
+    from .transfer import get_transfer_limiter  # transfer imports this module
+
+    limiter = get_transfer_limiter()
+    extra = limiter.reserve(min(len(pending), MAX_SEGMENTS) - 1)
+    queue = iter(pending)
+    queue_lock = threading.Lock()
+    failed = threading.Event()
+
+    def worker():
+        while not failed.is_set():
+            with queue_lock:
+                index = next(queue, None)
+            if index is None:
+                return
+            try:
+                _download_segment(file_id, part_path, progress, index, max_retries)
+            except Exception:
+                failed.set()
+                raise
 
+    try:
+        pool = get_segment_pool()
+        futures = [pool.submit(worker) for _ in range(1 + extra)]
+        wait(futures)
+    finally:
+        limiter.unreserve(extra)
+    for future in futures:
+        if future.exception() is not None:
+            raise future.exception()
 
-# ---------------- Download ----------------
 
 def download_file(file_id, save_file_path, max_retries=5):
-    """Download (with progress + retry) and decrypt a file from Google Drive."""
+    """
+    Download (with progress + retry) and decrypt a file from Google Drive.
+    Bytes land in a preallocated "<path>.part" via ranged GETs, large objects as
+    several concurrent segments. A JSON sidecar records each segment's progress,
+    so a retried task continues from the bytes already on disk.
+    """
     service = get_drive_service()
 
     try:
         # --- metadata ---
-        file_meta = service.files().get(fileId=file_id, fields="name,size").execute()
+        file_meta = service.files().get(
+            fileId=file_id, fields="name,size,md5Checksum,modifiedTime"
+        ).execute()
         file_name = file_meta.get("name", "unknown")
         file_size = int(file_meta.get("size", 0))
         readable_size = humanize.naturalsize(file_size)
-        logger.info(f"Downloading '{file_name}' ({readable_size}) to {save_file_path}")
-
-        request = service.files().get_media(fileId=file_id)
-        start_time = time.time()
-        done = False
-        last_percent = 0
-
-        with open(save_file_path, "wb") as fh:
-            downloader = MediaIoBaseDownload(fh, request, chunksize=10 * 1024 * 1024)
 
-            retries = 0
-            while not done:
-                try:
-                    status, done = downloader.next_chunk()
-                    if status:
-                        percent = int(status.progress() * 100)
-                        if percent - last_percent >= 5 or percent == 100:
-                            elapsed = time.time() - start_time
-                            downloaded = status.resumable_progress
-                            speed = downloaded / elapsed if elapsed else 0
-                            logger.info(
-                                f"{percent}% ({humanize.naturalsize(downloaded)} / {readable_size}) "
-                                f"at {humanize.naturalsize(speed)}/s"
-                            )
-                            last_percent = percent
-
-                except TimeoutError as e:
-                    retries += 1
-                    if retries > max_retries:
-                        logger.error(f"Download failed after {max_retries} retries: {e}")
-                        raise
-                    logger.warning(f"Timeout occurred (attempt {retries}/{max_retries}), retrying after 5s...")
-                    time.sleep(5)
-                    # Recreate downloader to resume
-                    downloader = MediaIoBaseDownload(fh, request, chunksize=10 * 1024 * 1024)
+        part_path = save_file_path + ".part"
+        state_path = part_path + ".json"
+        state = {
+            "file_id": file_id,
+            "size": file_size,
+            "md5Checksum": file_meta.get("md5Checksum"),
+            "modifiedTime": file_meta.get("modifiedTime"),
+        }
+        segments = _load_segments(state_path, state) if os.path.exists(part_path) else None
+        progress = _DownloadState(state_path, state, segments or plan_segments(file_size), readable_size)
 
+        if segments:
+            logger.info(
+                f"Resuming '{file_name}' at {humanize.naturalsize(progress.done())} / {readable_size}"
+            )
+        else:
+            logger.info(
+                f"Downloading '{file_name}' ({readable_size}) to {save_file_path} "
+                f"in {len(progress.segments)} segment(s)"
+            )
+            with open(part_path, "wb") as fh:
+                fh.truncate(file_size)  # preallocate, segments write in place
+            progress.save()
+
+        pending = [i for i, (start, end, written) in enumerate(progress.segments) if start + written <= end]
+        if len(pending) == 1:
+            _download_segment(file_id, part_path, progress, pending[0], max_retries)
+        elif pending:
+            _download_segments(file_id, part_path, progress, pending, max_retries)
+
+        os.replace(part_path, save_file_path)
+        os.remove(state_path)
         logger.info(f" Download complete: {save_file_path}")
 
-        # --- post-download ---
-        if save_file_path.endswith(".enc"):
-            logger.info("Decrypting downloaded file...")
-            save_file_path = decrypt_file(save_file_path)
-        if save_file_path.endswith(".zip"):
-            logger.info("Unzipping archive...")
-            return unzip_file(save_file_path)
-
-        return save_file_path
+        return finish_download(save_file_path)
 
     except HttpError as he:
         logger.error(f"Google API error: {he}")
@@ -313,69 +554,61 @@ def download_file(file_id, save_file_path, max_retries=5):
         logger.error(f"Download failed: {e}", exc_info=True)
         raise
 
-def list_files_in_folder(folder_id):
-    """List files inside a Drive folder."""
+def invalidate_folder_cache(*folder_ids):
+    """Forget cached listings of folders this process just wrote to."""
+    with _list_cache_lock:
+        for folder_id in folder_ids:
+            if folder_id:
+                _list_cache.pop(folder_id, None)
+
+
+def list_files_in_folder(folder_id, use_cache=True):
+    """
+    List every file inside a Drive folder, following nextPageToken.
+    Results are cached for LIST_CACHE_TTL seconds. Writes made through this
+    module invalidate the cache, and use_cache=False forces a fresh listing.
+    """
+    if use_cache:
+        with _list_cache_lock:
+            cached = _list_cache.get(folder_id)
+        if cached is not None:
+            return list(cached)
+
     service = get_drive_service()
     try:
         query = f"'{folder_id}' in parents and trashed=false"
-        results = service.files().list(
-            q=query, fields="files(id, name, mimeType)"
-        ).execute()
-        return results.get("files", [])
+        files, page_token = [], None
+        while True:
+            results = service.files().list(
+                q=query, fields=LIST_FIELDS,
+                pageSize=LIST_PAGE_SIZE, pageToken=page_token
+            ).execute()
+            files.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
     except Exception as e:
         logger.error(f"Failed to list folder {folder_id}: {e}")
         raise
 
+    with _list_cache_lock:
+        _list_cache[folder_id] = files
+    return list(files)
 
-def download_folder(folder_id, save_folder_path):
-    """Download a folder (recursive) with concurrent file downloads."""
-    os.makedirs(save_folder_path, exist_ok=True)
-    items = list_files_in_folder(folder_id)
-
-    if not items:
-        logger.warning(f"No files found in folder: {folder_id}")
-        return save_folder_path
-
-    folders = []
-    files = []
-
-    # Separate folders and files
-    for item in items:
-        item_id = item["id"]
-        item_name = item["name"]
-        item_type = item["mimeType"]
-
-        if item_type == "application/vnd.google-apps.folder":
-            folders.append((item_id, item_name))
-        else:
-            files.append((item_id, item_name))
-
-    # Parallel file downloads
-    def _safe_download_file(item_id, item_name):
-        """Wrapper for safe concurrent downloads."""
-        save_path = os.path.join(save_folder_path, item_name)
-        try:
-            logger.info(f"Downloading: {item_name}")
-            download_file(item_id, save_path)
-            logger.info(f"Completed: {item_name}")
-        except HttpError as he:
-            logger.error(f"Google API error while downloading {item_name}: {he}")
-        except Exception as e:
-            logger.error(f"Failed: {item_name} | Error: {e}")
-
-    if files:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            executor.map(lambda f: _safe_download_file(*f), files)
 
-    # Recurse into subfolders sequentially
-    for sub_id, sub_name in folders:
-        sub_folder_path = os.path.join(save_folder_path, sub_name)
-        download_folder(sub_id, sub_folder_path)
+# ---------------- Helpers ----------------
+def finish_download(save_file_path):
+    """Decrypt (.enc) and unpack (.zip) a downloaded file, return what it became."""
+    if save_file_path.endswith(".enc"):
+        logger.info("Decrypting downloaded file...")
+        save_file_path = decrypt_file(save_file_path)
+    if save_file_path.endswith(".zip"):
+        logger.info("Unzipping archive...")
+        return unzip_file(save_file_path)
 
-    return save_folder_path
+    return save_file_path
 
 
-# ---------------- Helpers ----------------
 def zip_local_folder(folder_path, output_zip_path):
     """Zip a folder into a .zip file."""
     os.makedirs(os.path.dirname(output_zip_path), exist_ok=True)
@@ -403,14 +636,51 @@ def unzip_file(zip_file):
     os.remove(zip_file)
     return extract_dir
 
-def delete_by_name(name: str, parent_id: str = None):
+def delete_files(file_ids, parent_id: str = None) -> list:
+    """
+    Delete Drive items by exact id, grouping up to BATCH_DELETE_SIZE deletes
+    per batch HTTP request. Deleting a folder removes its whole tree, so
+    folders never need to be walked. Returns the ids that could not be deleted.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    if not file_ids:
+        return []
+
+    service = get_drive_service()
+    failed = []
+
+    def _on_delete(request_id, response, exception):
+        if exception is None:
+            logger.info(f"Deleted Drive item {request_id}")
+        elif isinstance(exception, HttpError) and exception.resp.status == 404:
+            logger.info(f"Drive item {request_id} already gone")
+        else:
+            failed.append(request_id)
+            logger.error(f"Failed to delete Drive item {request_id}: {exception}")
+
+    for start in range(0, len(file_ids), BATCH_DELETE_SIZE):
+        batch = service.new_batch_http_request(callback=_on_delete)
+        for file_id in file_ids[start:start + BATCH_DELETE_SIZE]:
+            batch.add(service.files().delete(fileId=file_id), request_id=file_id)
+        batch.execute()
+
+    invalidate_folder_cache(parent_id, *file_ids)
+    return failed
+
+
+def _quote(value: str) -> str:
+    """Escape a value for a Drive query string literal."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def delete_by_name(name: str, parent_id: str = None) -> list:
     """
-    Delete a file or folder by name (recursively if folder).
+    Delete the files or folders named exactly `name` (inside `parent_id` if given).
+    Returns the ids that were deleted.
     """
     service = get_drive_service()
     try:
-        # More lenient match (case-insensitive partial)
-        query = f"name contains '{name}' and trashed = false"
+        query = f"name = '{_quote(name)}' and trashed = false"
         if parent_id:
             query += f" and '{parent_id}' in parents"
 
@@ -422,32 +692,16 @@ def delete_by_name(name: str, parent_id: str = None):
 
         if not files:
             logger.warning(f"No file/folder found for '{name}'.")
-            return False
+            return []
 
         for f in files:
-            file_id = f["id"]
-            mime_type = f["mimeType"]
-            logger.info(f"Found {f['name']} ({mime_type}) -> {file_id}")
-
-            # If it's a folder, delete contents first
-            if mime_type == "application/vnd.google-apps.folder":
-                child_results = service.files().list(
-                    q=f"'{file_id}' in parents and trashed = false",
-                    fields="files(id, name, mimeType)"
-                ).execute()
-
-                for child in child_results.get("files", []):
-                    delete_by_name(child["name"], file_id)
-
-            # Delete file/folder itself
-            try:
-                service.files().delete(fileId=file_id).execute()
-                logger.info(f"Deleted: {f['name']} (id: {file_id})")
-            except Exception as e:
-                logger.error(f"Failed to delete {f['name']} ({file_id}): {e}")
+            logger.info(f"Found {f['name']} ({f['mimeType']}) -> {f['id']}")
 
-        return True
+        parents = {p for f in files for p in f.get("parents", [])}
+        failed = set(delete_files([f["id"] for f in files], parent_id))
+        invalidate_folder_cache(*parents)
+        return [f["id"] for f in files if f["id"] not in failed]
 
     except Exception as e:
         logger.exception(f"Delete failed for '{name}': {e}")
-        return False
\ No newline at end of file
+        return []
@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import time
+
+import psutil
+from redis import asyncio as aioredis
+
+from .celery_app import celery_app
+from .config import setting
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class LoadSampler:
+    """
+    Samples CPU, memory and event-loop lag in a background task and keeps an
+    EWMA of each, so request handling only reads cached numbers.
+    Shedding starts when a signal rises above its shed threshold and only stops
+    once every signal is back under its resume threshold (hysteresis).
+    """
+
+    def __init__(
+        self,
+        interval: float = setting.load_sample_interval,
+        alpha: float = setting.load_ewma_alpha,
+    ):
+        self.interval = interval
+        self.alpha = alpha
+        self.cpu = 0.0
+        self.mem = 0.0
+        self.loop_lag_ms = 0.0
+        self.overloaded = False
+        self.sampled_at = None
+        self._task = None
+
+    def _ewma(self, previous: float, value: float) -> float:
+        if self.sampled_at is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * previous
+
+    def update(self, cpu: float, mem: float, loop_lag_ms: float):
+        self.cpu = self._ewma(self.cpu, cpu)
+        self.mem = self._ewma(self.mem, mem)
+        self.loop_lag_ms = self._ewma(self.loop_lag_ms, loop_lag_ms)
+        self.sampled_at = time.monotonic()
+
+        if not self.overloaded and (
+            self.cpu > setting.load_shed_cpu
+            or self.mem > setting.load_shed_mem
+            or self.loop_lag_ms > setting.load_shed_loop_lag_ms
+        ):
+            self.overloaded = True
+            logger.warning(f"Server overloaded, shedding: {self.snapshot()}")
+        elif self.overloaded and (
+            self.cpu < setting.load_resume_cpu
+            and self.mem < setting.load_resume_mem
+            and self.loop_lag_ms < setting.load_resume_loop_lag_ms
+        ):
+            self.overloaded = False
+            logger.info(f"Server load back to normal: {self.snapshot()}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        psutil.cpu_percent(interval=None)  # prime: the first reading is meaningless
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            # How late the loop woke us up is the lag every request sees
+            lag_ms = max(0.0, (loop.time() - started - self.interval) * 1000)
+            try:
+                self.update(
+                    psutil.cpu_percent(interval=None),  # since the previous call, never blocks
+                    psutil.virtual_memory().percent,
+                    lag_ms,
+                )
+            except Exception as e:
+                logger.error(f"Load sampling failed: {e}", exc_info=True)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="load-sampler")
+            logger.info(f"Load sampler started (every {self.interval}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "cpu_percent": round(self.cpu, 1),
+            "mem_percent": round(self.mem, 1),
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "overloaded": self.overloaded,
+        }
+
+
+load_sampler = LoadSampler()
+
+
+class QueueDepthPoller:
+    """
+    Publishes the Celery backlog as one cached number.
+    Broker queue lengths (Redis LLEN per queue) are read every poll; the
+    active + reserved counts need a broadcast to the workers, so they are
+    refreshed less often and in a thread, never on the event loop.
+    """
+
+    def __init__(
+        self,
+        interval: float = setting.queue_poll_interval,
+        inspect_interval: float = setting.queue_inspect_interval,
+    ):
+        self.interval = interval
+        self.inspect_interval = inspect_interval
+        self.queues = [q.strip() for q in setting.celery_queues.split(",") if q.strip()]
+        self.queued = {}
+        self.in_progress = 0
+        self.backlog = 0
+        self.polled_at = None
+        self._inspected_at = None
+        self._inspect_future = None
+        self._redis = None
+        self._task = None
+
+    def _inspect_counts(self) -> int:
+        inspector = celery_app.control.inspect(timeout=1.0)
+        total = 0
+        for replies in (inspector.active(), inspector.reserved()):
+            if replies:
+                total += sum(len(tasks) for tasks in replies.values() if tasks)
+        return total
+
+    async def poll(self):
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            self.queued = dict(zip(self.queues, await pipe.execute()))
+
+        # Workers are inspected in the background; use the last answer meanwhile
+        now = time.monotonic()
+        if self._inspect_future is not None and self._inspect_future.done():
+            try:
+                self.in_progress = self._inspect_future.result()
+            except Exception as e:
+                logger.warning(f"Celery inspect failed: {e}")
+            self._inspect_future = None
+        if self._inspect_future is None and (
+            self._inspected_at is None or now - self._inspected_at >= self.inspect_interval
+        ):
+            self._inspected_at = now
+            self._inspect_future = asyncio.get_running_loop().run_in_executor(None, self._inspect_counts)
+
+        self.backlog = sum(self.queued.values()) + self.in_progress
+        self.polled_at = now
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Queue depth poll failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            if setting.celery_broker_url.startswith(("redis://", "rediss://")):
+                self._redis = aioredis.from_url(setting.celery_broker_url)
+            else:
+                logger.warning("Broker is not Redis, queue lengths are not polled")
+            self._task = asyncio.create_task(self._run(), name="queue-depth-poller")
+            logger.info(f"Queue depth poller started for {self.queues}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.backlog > setting.queue_backlog_limit
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_progress": self.in_progress,
+            "backlog": self.backlog,
+            "limit": setting.queue_backlog_limit,
+        }
+
+
+queue_poller = QueueDepthPoller()
@@ -1,6 +1,6 @@
 from app.database import sessionLocal
 from app.model import UserDB
-from app.send_mssg import verification_msg
+from app.outbound import queue_message, HIGH
 
 # Configure logging
 from app.logging_config import get_logger
@@ -18,7 +18,8 @@ def get_login_status(phone: str, country: str, link_code: str):
 
             if user.link_code != link_code:
                 phone_number = phone[1:]
-                verification_msg(phone_number, link_code)
+                # The link code expires, so it jumps the outbound queue
+                queue_message("verification_msg", phone_number, link_code, priority=HIGH)
 
                 user.link_code = link_code
                 db.commit()
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from sqlalchemy import delete, exists, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.model import MediaBlobDB, StatusDB
+from .storage import get_storage, FOLDER_MIME_TYPE
+
+# ---------------- Logging ----------------
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# ---------------- Config ----------------
+# Every blob lives once in this shared storage folder, named "<sha256>.enc"
+BLOB_FOLDER_NAME = "media-blobs"
+# Orphans younger than this may belong to a status still being created
+ORPHAN_GRACE = timedelta(days=1)
+
+_blob_folder_id = os.environ.get("MEDIA_BLOB_FOLDER_ID")
+_blob_folder_lock = threading.Lock()
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_blob_folder_id() -> str:
+    """Id of the shared blob folder, found or created once per process."""
+    global _blob_folder_id
+    with _blob_folder_lock:
+        if _blob_folder_id:
+            return _blob_folder_id
+
+        storage = get_storage()
+        # Two workers may create it at the same time: every one then settles
+        # on the smallest id, blobs are referenced by file id anyway
+        matches = sorted(
+            item["id"] for item in storage.list(storage.root_id, use_cache=False)
+            if item.get("mimeType") == FOLDER_MIME_TYPE and item.get("name") == BLOB_FOLDER_NAME
+        )
+        _blob_folder_id = matches[0] if matches else storage.create_folder(BLOB_FOLDER_NAME)["id"]
+        logger.info(f"Using media blob folder {_blob_folder_id}")
+        return _blob_folder_id
+
+
+def put_media(db, file_path: str, sha256: str | None = None) -> str:
+    """
+    Store an image once per content hash and return its storage file id.
+    Nothing is uploaded when a blob with the same hash already exists.
+    """
+    sha256 = sha256 or sha256_file(file_path)
+
+    file_id = db.scalar(select(MediaBlobDB.file_id).where(MediaBlobDB.sha256 == sha256))
+    if file_id:
+        logger.info(f"Media {sha256[:12]} already stored, skipping upload")
+        return file_id
+
+    folder_id = get_blob_folder_id()
+    size = os.path.getsize(file_path)
+    with tempfile.TemporaryDirectory() as staging:
+        # upload_file encrypts and removes what it is given: hand it a copy named by hash
+        staged = os.path.join(staging, sha256)
+        shutil.copyfile(file_path, staged)
+        uploaded = get_storage().upload_file(staged, folder_id)
+
+    file_id = db.execute(
+        pg_insert(MediaBlobDB)
+        .values(sha256=sha256, file_id=uploaded["id"], size=size)
+        .on_conflict_do_nothing(index_elements=["sha256"])
+        .returning(MediaBlobDB.file_id)
+    ).scalar_one_or_none()
+    db.commit()
+
+    if file_id is None:
+        # Another worker stored the same content first, keep theirs
+        get_storage().delete([uploaded["id"]], folder_id)
+        file_id = db.scalar(select(MediaBlobDB.file_id).where(MediaBlobDB.sha256 == sha256))
+        logger.info(f"Media {sha256[:12]} stored concurrently, dropped duplicate upload")
+    else:
+        logger.info(f"Stored media {sha256[:12]} as {file_id}")
+    return file_id
+
+
+def fetch_media(file_id: str, save_file_path: str) -> str:
+    """Download and decrypt a blob to save_file_path."""
+    os.makedirs(os.path.dirname(save_file_path), exist_ok=True)
+    return get_storage().download_file(file_id, save_file_path + ".enc")
+
+
+def blob_file_ids(db, hashes) -> dict:
+    """sha256 -> storage file id for the given hashes."""
+    hashes = {sha for sha in hashes if sha}
+    if not hashes:
+        return {}
+    rows = db.execute(
+        select(MediaBlobDB.sha256, MediaBlobDB.file_id).where(MediaBlobDB.sha256.in_(hashes))
+    ).all()
+    return dict(rows)
+
+
+def _unreferenced():
+    return ~exists().where(StatusDB.media_sha256 == MediaBlobDB.sha256)
+
+
+def release_media(db, sha256: str) -> bool:
+    """
+    Remove a blob if no status references it any more.
+    The reference check and the delete are one statement.
+    """
+    file_id = db.execute(
+        delete(MediaBlobDB)
+        .where(MediaBlobDB.sha256 == sha256, _unreferenced())
+        .returning(MediaBlobDB.file_id)
+    ).scalar_one_or_none()
+    db.commit()
+
+    if file_id is None:
+        logger.info(f"Media {sha256[:12]} still referenced (or already gone), kept")
+        return False
+
+    get_storage().delete([file_id], get_blob_folder_id())
+    logger.info(f"Deleted unreferenced media {sha256[:12]}")
+    return True
+
+
+def collect_orphans(db) -> int:
+    """Remove blobs left without statuses, e.g. after a user was deleted."""
+    file_ids = db.execute(
+        delete(MediaBlobDB)
+        .where(
+            _unreferenced(),
+            MediaBlobDB.created_at < func.now() - ORPHAN_GRACE,
+        )
+        .returning(MediaBlobDB.file_id)
+    ).scalars().all()
+    db.commit()
+
+    if file_ids:
+        get_storage().delete(file_ids, get_blob_folder_id())
+    return len(file_ids)
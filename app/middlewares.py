@@ -1,80 +1,183 @@
-import psutil
-# from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+import hashlib
+import hmac
+import time
+
+from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-from redis import asyncio as aioredis
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-from .celery_app import celery_app
+from .concurrency import GradientLimit
 from .config import setting
+from .load_monitor import load_sampler, queue_poller
+from .rate_limit import rate_limiter, retry_after_header
 
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
 
-class LoadBalancerMiddleware(BaseHTTPMiddleware):
+# Operators must still be able to see why requests are being shed
+ADMISSION_EXEMPT_PREFIXES = ("/metrics/",)
+
+# Route classes, highest priority first: (name, path prefixes, initial limit).
+# Webhook acks must stay within Meta's timeout, status CRUD can wait.
+ROUTE_CLASSES = (
+    ("webhook", ("/webhook",), 50),
+    ("flow", ("/flow",), 30),
+    ("crud", ("",), 20),
+)
+
+# Flow handlers call the app's own /user and /status endpoints over HTTP. Those
+# inner calls carry this header and run under the slot the outer request holds,
+# otherwise they would be shed as crud while their flow request waits on them.
+INTERNAL_CALL_HEADER = "x-internal-call"
+
+
+def _internal_call_token(route_class: str) -> str:
+    return hmac.new(
+        setting.app_secret.encode(), f"admission:{route_class}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def internal_call_headers(route_class: str) -> dict:
+    """Headers for a request the app makes to itself on behalf of `route_class`."""
+    return {INTERNAL_CALL_HEADER: f"{route_class}:{_internal_call_token(route_class)}"}
+
+
+class AdmissionControlMiddleware:
     """
-    Dynamic load balancing middleware.
-    Adapts based on CPU cores, available memory, and system usage trends.
+    Pure ASGI admission control.
+    Every route class has its own latency driven concurrency limit
+    (GradientLimit). While a higher priority class is congested, lower ones
+    run at half their limit, so low priority traffic is shed first. The
+    background load and queue signals only shed the lowest class.
+    Calls the app makes to itself for a higher class (INTERNAL_CALL_HEADER)
+    pass straight through: their outer request already holds a slot.
+    Admitted requests go to the app untouched (no extra task or body stream).
     """
-    async def dispatch(self, request, call_next):
+
+    def __init__(self, app, retry_after: int = 5):
+        self.app = app
+        self.retry_after = str(retry_after)
+        self.classes = [
+            (prefixes, GradientLimit(name, initial=initial))
+            for name, prefixes, initial in ROUTE_CLASSES
+        ]
+        admission_limits.extend(limit for _, limit in self.classes)
+        # Only classes above the lowest can lend their slot to an inner call
+        self.internal_tokens = {
+            f"{name}:{_internal_call_token(name)}".encode()
+            for name, _, _ in ROUTE_CLASSES[:-1]
+        }
+        self._header = INTERNAL_CALL_HEADER.encode()
+
+    def _is_internal_call(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self._header:
+                return any(hmac.compare_digest(value, token) for token in self.internal_tokens)
+        return False
+
+    def _classify(self, path: str) -> int:
+        for index, (prefixes, _) in enumerate(self.classes):
+            if path.startswith(prefixes):
+                return index
+        return len(self.classes) - 1
+
+    def _reject(self, scope, receive, send, detail: str):
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=503,
+            headers={"Retry-After": self.retry_after},
+        )
+        return response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(ADMISSION_EXEMPT_PREFIXES)
+            or self._is_internal_call(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        index = self._classify(scope["path"])
+        limiter = self.classes[index][1]
+
+        if index == len(self.classes) - 1:
+            if load_sampler.overloaded:
+                await self._reject(scope, receive, send, "Server is currently overloaded, please retry later.")
+                return
+            if queue_poller.saturated:
+                await self._reject(scope, receive, send, "Background task queue full. Try again later.")
+                return
+
+        limit = limiter.limit
+        if any(higher.congested for _, higher in self.classes[:index]):
+            limit = max(limiter.minimum, limit / 2)
+        if not limiter.try_acquire(limit):
+            await self._reject(scope, receive, send, "Server is busy, please retry later.")
+            return
+
+        started = time.monotonic()
         try:
-            # Compute server load
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            mem = psutil.virtual_memory()
-            mem_percent = mem.percent
-            max_cpu, max_mem = 90, 90  # safety thresholds
-
-            if cpu_percent > max_cpu or mem_percent > max_mem:
-                logger.warning(f"Server overloaded: CPU={cpu_percent}% MEM={mem_percent}%")
-                return JSONResponse(
-                    {"detail": "Server is currently overloaded, please retry later."},
-                    status_code=503,
-                )
-
-            response = await call_next(request)
-            return response
-
-        except Exception as e:
-            logger.error(f"Load balance middleware error: {e}", exc_info=True)
-            return JSONResponse({"detail": "Internal server error"}, status_code=500)
-
-class CeleryQueueMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        i =celery_app.control.inspect()
-        active_tasks = i.active()
-        if active_tasks:
-            active = sum(len(v) for v in active_tasks.values() if v)
-            if active > 500:  # Example threshold
-                return JSONResponse(
-                    {"detail": "Background task queue full. Try again later."},
-                    status_code=503,
-                )
-        return await call_next(request)
-
-
-async def init_rate_limiter(redis_urls=None):
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(started)
+
+
+# Limits of every AdmissionControlMiddleware in the process, for /metrics/load
+admission_limits: list[GradientLimit] = []
+
+
+# Path parameters that identify who is calling, most specific first
+IDENTITY_PARAMS = ("phone_number", "user_id")
+
+
+async def init_rate_limiter():
     """
-    Initialize a distributed Redis cluster rate limiter for millions of users.
+    Start the two-tier rate limiter (local token buckets, batched Redis sync).
     """
     try:
-        redis = await aioredis.from_url(
-            setting.redis_url,
-            encoding="utf-8",
-            decode_responses=True,
-        )
-        await FastAPILimiter.init(redis)
-        logger.info(" Distributed rate limiter initialized with nodes")
-        return redis
+        rate_limiter.start()
     except Exception as e:
-        logger.error(f" Failed to initialize Redis cluster: {e}")
+        logger.error(f" Failed to initialize rate limiter: {e}")
         raise
 
 
+async def close_rate_limiter():
+    await rate_limiter.stop()
+
+
+def rate_limit_identity(request: Request) -> str:
+    """
+    Who a request counts against: the phone number (or user id) in the path.
+    Meta's webhooks and flows all come from a few IPs, so the client address
+    is only the last resort.
+    """
+    for name in IDENTITY_PARAMS:
+        value = request.path_params.get(name)
+        if value:
+            return f"{name}:{value}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def check_rate_limit(key: str, times: int, window_seconds: int):
+    """Count one hit for `key`; raises 429 when it is over its limit."""
+    allowed, retry_after = rate_limiter.hit(key, times, window_seconds)
+    if not allowed:
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too Many Requests",
+            headers=retry_after_header(retry_after),
+        )
+
+
 def get_rate_limit(times: int = 100, window_seconds: int = 60):
     """
     Create a rate limiter dependency.
-    Example: Depends(get_rate_limit(100, 60)) -> 100 reqs/min per user.
+    Example: Depends(get_rate_limit(100, 60)) -> 100 reqs/min per user and route.
     """
-    return RateLimiter(times=times, seconds=window_seconds)
\ No newline at end of file
+    async def limit(request: Request):
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.url.path
+        check_rate_limit(f"{rate_limit_identity(request)}:{path}", times, window_seconds)
+
+    return limit
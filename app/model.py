@@ -1,5 +1,9 @@
 from datetime import datetime, time
-from sqlalchemy import ForeignKey, String, UniqueConstraint, Time
+from sqlalchemy import (
+    ForeignKey, String, UniqueConstraint, Time, CheckConstraint, Index,
+    SmallInteger, BigInteger, text as sa_text
+)
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.sql import func
 from sqlalchemy.orm import (
     Mapped, mapped_column, relationship, DeclarativeBase
@@ -8,6 +12,9 @@ from uuid import UUID, uuid4
 from enum import Enum
 from typing import List
 
+# Maximum number of statuses a single user may keep scheduled
+MAX_STATUSES = 20
+
 class Base(DeclarativeBase):
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
 
@@ -17,6 +24,10 @@ class UserDB(Base):
     __tablename__ = "users"
     __table_args__ = (
         UniqueConstraint("phone", 'country', name="uq_user_phone_country"),
+        CheckConstraint(
+            f"sequence >= 0 AND sequence <= {MAX_STATUSES}",
+            name="ck_users_sequence_quota",
+        ),
     )
 
     phone: Mapped[str] = mapped_column(String(20), nullable=False, unique=True, index=True)
@@ -27,6 +38,7 @@ class UserDB(Base):
     login_status: Mapped[bool] = mapped_column(default=False)
     link_code: Mapped[str] = mapped_column(String(9), nullable=True, default="")
     main_folder_id: Mapped[ str | None] = mapped_column(String(50), unique=True, nullable=True)
+    media_folder_id: Mapped[str | None] = mapped_column(String(50), unique=True, nullable=True)
     sequence: Mapped[int] = mapped_column(default=0, nullable=True)
     statuses: Mapped[List["StatusDB"]] = relationship(
         "StatusDB", back_populates="user", cascade="all, delete"
@@ -44,8 +56,65 @@ class ScheduleEnum(str, Enum):
     EVERY_2_WEEKS = "Every 2 Weeks"
 
 
+# Interval in days stored in statuses.schedule for each label
+SCHEDULE_INTERVAL_DAYS = {
+    ScheduleEnum.EVERYDAY: 1,
+    ScheduleEnum.EVERY_2_DAYS: 2,
+    ScheduleEnum.EVERY_3_DAYS: 3,
+    ScheduleEnum.EVERY_4_DAYS: 4,
+    ScheduleEnum.EVERY_5_DAYS: 5,
+    ScheduleEnum.EVERY_6_DAYS: 6,
+    ScheduleEnum.EVERY_WEEK: 7,
+    ScheduleEnum.EVERY_10_DAYS: 10,
+    ScheduleEnum.EVERY_2_WEEKS: 14,
+}
+SCHEDULE_BY_INTERVAL = {days: schedule for schedule, days in SCHEDULE_INTERVAL_DAYS.items()}
+
+
+class ScheduleType(TypeDecorator):
+    """
+    ScheduleEnum in Python, its interval in days (SMALLINT) in the database,
+    so the due check can be done with date arithmetic in SQL.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return SCHEDULE_INTERVAL_DAYS[ScheduleEnum(value)]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return SCHEDULE_BY_INTERVAL[value]
+
+
 class StatusDB(Base):
     __tablename__ = "statuses"
+    __table_args__ = (
+        # schedule_status_task: pending statuses inside the next scheduling window,
+        # covering the columns it reads so the heap is only touched for visibility
+        Index(
+            "ix_statuses_pending_schedule_time", "schedule_time",
+            postgresql_where=sa_text("is_upload = false"),
+            postgresql_include=["user_id", "created_at", "schedule"],
+        ),
+        # update_is_uploaded: the nightly reset only touches uploaded statuses
+        Index(
+            "ix_statuses_uploaded", "id",
+            postgresql_where=sa_text("is_upload = true"),
+        ),
+        # create_status: duplicate image check
+        Index(
+            "ix_statuses_user_id_images_path", "user_id", "images_path",
+            postgresql_where=sa_text("is_text = false"),
+        ),
+        CheckConstraint(
+            f"schedule IN ({', '.join(str(days) for days in SCHEDULE_INTERVAL_DAYS.values())})",
+            name="ck_statuses_schedule_days",
+        ),
+    )
 
     user_id: Mapped[int] = mapped_column(ForeignKey(
         "users.id", ondelete="CASCADE"
@@ -54,10 +123,27 @@ class StatusDB(Base):
     is_upload: Mapped[bool] = mapped_column(default=False)
     is_text: Mapped[bool] = mapped_column(default=False)
     images_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Content hash of the image, the key of its MediaBlobDB (image statuses only)
+    media_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(
         default=func.now()
     )
-    schedule: Mapped[ScheduleEnum] = mapped_column(String(20), default=ScheduleEnum.EVERYDAY.value)
+    schedule: Mapped[ScheduleEnum] = mapped_column(ScheduleType(), default=ScheduleEnum.EVERYDAY)
     schedule_time: Mapped[time] = mapped_column(Time(), default=time(7, 0))
 
-    user: Mapped[UserDB] = relationship(back_populates="statuses")
\ No newline at end of file
+    user: Mapped[UserDB] = relationship(back_populates="statuses")
+
+
+class MediaBlobDB(Base):
+    """
+    One stored copy of an image, shared by every status with the same content.
+    Referenced from StatusDB.media_sha256; removed once no status points at it.
+    """
+    __tablename__ = "media_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        default=func.now()
+    )
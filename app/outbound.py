@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from .celery_app import celery_app
+from .checkpoints import get_redis
+from .send_mssg import first_message, verification_msg, registration_flow_mssg, wow_flow_mssg
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# ---------------- Priorities ----------------
+# One worker consumes both queues in this order with the "priority" queue
+# order strategy, so a verification code never waits behind a bulk backlog.
+HIGH = "messages_high"
+BULK = "messages_bulk"
+PRIORITIES = (HIGH, BULK)
+
+TEMPLATES = {
+    "verification_msg": verification_msg,
+    "first_message": first_message,
+    "registration_flow_mssg": registration_flow_mssg,
+    "wow_flow_mssg": wow_flow_mssg,
+}
+
+# ---------------- Latency metrics ----------------
+LATENCY_SAMPLES = 1000
+LATENCY_KEY = "outbound:latency:{}"
+
+
+def record_latency(priority: str, seconds: float):
+    """Keep the last LATENCY_SAMPLES queue latencies (ms) of a priority in Redis."""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        key = LATENCY_KEY.format(priority)
+        pipe = client.pipeline(transaction=False)
+        pipe.lpush(key, round(seconds * 1000, 1))
+        pipe.ltrim(key, 0, LATENCY_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record outbound latency: {e}")
+
+
+def latency_snapshot() -> dict:
+    """Queue latency percentiles per priority over the recent samples."""
+    client = get_redis()
+    snapshot = {}
+    for priority in PRIORITIES:
+        samples = []
+        if client is not None:
+            try:
+                samples = sorted(float(v) for v in client.lrange(LATENCY_KEY.format(priority), 0, -1))
+            except Exception as e:
+                logger.warning(f"Could not read outbound latency: {e}")
+        if not samples:
+            snapshot[priority] = {"samples": 0}
+            continue
+        cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+        snapshot[priority] = {
+            "samples": len(samples),
+            "p50_ms": cuts[49],
+            "p95_ms": cuts[94],
+            "p99_ms": cuts[98],
+            "max_ms": samples[-1],
+        }
+    return snapshot
+
+
+# ---------------- Queue ----------------
+@celery_app.task(bind=True, max_retries=3)
+def send_message(self, template: str, args: list, priority: str, enqueued_at: float):
+    """Send one template message taken from the outbound queue of `priority`."""
+    if self.request.retries == 0:
+        record_latency(priority, max(0.0, time.time() - enqueued_at))
+    try:
+        return TEMPLATES[template](*args)
+    except Exception as e:
+        logger.error(f"Error sending {template} ({priority}): {e}", exc_info=True)
+        self.retry(exc=e, countdown=2 if priority == HIGH else 10)
+
+
+def queue_message(template: str, *args, priority: str = BULK):
+    """Put a template message on the outbound queue for `priority`."""
+    if template not in TEMPLATES:
+        raise ValueError(f"Unknown message template: {template}")
+    return send_message.apply_async(args=(template, list(args), priority, time.time()), queue=priority)
@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import math
+import threading
+import time
+
+from cachetools import TTLCache
+from redis import asyncio as aioredis
+
+from .config import setting
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """`capacity` requests per `window` seconds, refilled continuously."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class TwoTierRateLimiter:
+    """
+    Rate limiting without a Redis round trip per request.
+
+    Tier 1: an in-process token bucket per key answers every request.
+    Tier 2: hits are counted locally and flushed to Redis in one pipeline every
+    `sync_interval` seconds (fixed window counter per key). When the cluster
+    wide count of a window reaches the limit, the key is blocked locally until
+    the window ends. Between two flushes every process may admit up to its own
+    bucket, which bounds the overshoot to (processes - 1) x one sync interval.
+    """
+
+    def __init__(self, sync_interval: float = 1.0, max_keys: int = 100_000):
+        self.sync_interval = sync_interval
+        self._buckets = TTLCache(maxsize=max_keys, ttl=3600)
+        self._blocked = TTLCache(maxsize=max_keys, ttl=3600)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._task = None
+
+    def hit(self, key: str, times: int, seconds: int) -> tuple[bool, float]:
+        """Count one request for `key`; returns (allowed, retry_after seconds)."""
+        now = time.monotonic()
+        wall = time.time()
+        window = int(wall // seconds)
+        with self._lock:
+            blocked_until = self._blocked.get(key)
+            if blocked_until is not None and wall < blocked_until:
+                return False, blocked_until - wall
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(times, seconds)
+            if not bucket.take(now):
+                return False, bucket.retry_after()
+
+            entry = self._pending.setdefault((key, window), [0, times, seconds])
+            entry[0] += 1
+            return True, 0.0
+
+    async def flush(self):
+        """Push the pending counts to Redis and block keys that went over globally."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._redis is None:
+            return
+
+        pipe = self._redis.pipeline(transaction=False)
+        for (key, window), (count, _, seconds) in pending.items():
+            redis_key = f"ratelimit:{key}:{window}"
+            pipe.incrby(redis_key, count)
+            pipe.expire(redis_key, seconds * 2)
+        results = await pipe.execute()
+
+        with self._lock:
+            for ((key, window), (_, times, seconds)), total in zip(pending.items(), results[::2]):
+                if total >= times:
+                    self._blocked[key] = (window + 1) * seconds
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Redis being down only costs the global tier, local buckets keep working
+                logger.warning(f"Rate limit sync failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._redis = aioredis.from_url(setting.redis_url, encoding="utf-8", decode_responses=True)
+            self._task = asyncio.create_task(self._run(), name="rate-limit-sync")
+            logger.info(f"Rate limiter started (Redis sync every {self.sync_interval}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._redis is not None:
+            with contextlib.suppress(Exception):
+                await self.flush()
+            await self._redis.aclose()
+            self._redis = None
+
+
+rate_limiter = TwoTierRateLimiter(sync_interval=setting.rate_limit_sync_interval)
+
+
+def retry_after_header(retry_after: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
@@ -2,13 +2,14 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import PlainTextResponse
 import httpx
 import os
-import pytz
 import base64
 from dotenv import load_dotenv
 from pathlib import Path
-from datetime import datetime, timedelta, time
+from datetime import time
 from ..model import ScheduleEnum
 from app.crypto import decrypt_request, encrypt_response, decrypt_whatsapp_media
+from app.config import setting
+from app.middlewares import check_rate_limit, internal_call_headers
 from app.logging_config import get_logger
 
 # Initialize logger
@@ -35,23 +36,6 @@ def encode_image_base64(path: str | None) -> str | None:
         return ""
 
 
-def is_due_by_schedule(schedule: ScheduleEnum, days_diff: int) -> bool:
-    """Check if status is due to upload based on schedule."""
-    schedule_map = {
-        ScheduleEnum.EVERYDAY.value: 1,
-        ScheduleEnum.EVERY_2_DAYS.value: 2,
-        ScheduleEnum.EVERY_3_DAYS.value: 3,
-        ScheduleEnum.EVERY_4_DAYS.value: 4,
-        ScheduleEnum.EVERY_5_DAYS.value: 5,
-        ScheduleEnum.EVERY_6_DAYS.value: 6,
-        ScheduleEnum.EVERY_WEEK.value: 7,
-        ScheduleEnum.EVERY_10_DAYS.value: 10,
-        ScheduleEnum.EVERY_2_WEEKS.value: 14,
-    }
-    interval = schedule_map.get(schedule, 1)
-    return days_diff % interval == 0
-
-
 schedule_map = {
         ScheduleEnum.EVERYDAY.value: "Every Day",
         ScheduleEnum.EVERY_2_DAYS.value: "Every 2D",
@@ -98,7 +82,7 @@ async def handle_signup_screen(data, phone_number, flow_token, version):
             return get_error_screen("The phone number must match this WhatsApp number.", flow_token, version)
 
         USER_ENDPOINT = os.getenv("USER_ENDPOINT", "http://localhost:8000/user")
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(headers=internal_call_headers("flow")) as client:
             forward_response = await client.post(USER_ENDPOINT, json=data)
 
         if forward_response.status_code >= 400:
@@ -118,7 +102,7 @@ async def handle_get_status_screen(data, phone_number, flow_token, version):
     """Handle GET STATUS logic (View or Delete)."""
     try:
         STATUS_ENDPOINT = os.getenv("STATUS_ENDPOINT", "http://localhost:8000/status")
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(headers=internal_call_headers("flow")) as client:
             forward_response = await client.get(f"{STATUS_ENDPOINT}/{phone_number}")
 
         if forward_response.status_code >= 400:
@@ -148,15 +132,8 @@ async def handle_get_status_screen(data, phone_number, flow_token, version):
 
             created_at = created_at.split(".")[0]
 
-            timezone = pytz.timezone("Africa/Lagos")
-            now = datetime.now(timezone)
-            start_time = (now - timedelta(minutes=5)).time()
-            end_time = (now + timedelta(minutes=35)).time()
-            days_diff = (now.date() - datetime.fromisoformat(str(status["created_at"])).date()).days
-            is_within_window = start_time <= time.fromisoformat(str(status["schedule_time"])) <= end_time
-
-            is_enabled = ((is_due_by_schedule(status["schedule"], days_diff) or days_diff == 1)
-                              and is_within_window and not status["is_upload"])
+            # Computed by the status API in the same query that loaded the statuses
+            is_enabled = status.get("upload_window_active", False)
 
             if is_view:
                 status_dict = {
@@ -226,7 +203,7 @@ async def handle_add_status_screen(data, phone_number, flow_token, version):
                 logger.warning("Failed to add status: did  not cancel image or unselect only_text.")
                 return get_error_screen("Please cancel image or unselect only_text.", flow_token, version)
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(headers=internal_call_headers("flow")) as client:
             forward_response = await client.post(ADD_STATUS_ENDPOINT, json=data)
 
         if forward_response.status_code >= 400:
@@ -244,7 +221,7 @@ async def handle_delete_status_screen(data, phone_number, flow_token, version):
     try:
         STATUS_ENDPOINT = os.getenv("STATUS_ENDPOINT", "http://localhost:8000/status")
         DELETE_ENDPOINT = f"{STATUS_ENDPOINT}/{phone_number}/{data.get('id')}"
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(headers=internal_call_headers("flow")) as client:
             forward_response = await client.delete(DELETE_ENDPOINT)
             if forward_response.status_code >= 400:
                     logger.warning(f"Failed to delete status: {forward_response.text}")
@@ -277,7 +254,7 @@ async def handle_update_status_screen(data, phone_number, flow_token, version):
         status_id = data.pop("status_id", None) 
         STATUS_ENDPOINT = os.getenv("STATUS_ENDPOINT", "http://localhost:8000/status") 
         UPDATE_STATUS_ENDPOINT = f"{STATUS_ENDPOINT}/{phone_number}/{status_id}"
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(headers=internal_call_headers("flow")) as client:
             forward_response = await client.put(UPDATE_STATUS_ENDPOINT, json=data)
             if forward_response.status_code >= 400:
                     logger.warning(f"Failed to update status: {forward_response.text}")
@@ -311,6 +288,9 @@ async def receive_whatsapp_flow(request: Request):
         data = payload.get("data", {})
         phone_number = f"+{flow_token}"
 
+        # Flows arrive encrypted from Meta: the flow token is the first identity we see
+        check_rate_limit(f"flow_token:{flow_token}", setting.flow_rate_limit, 60)
+
         plaintext_response = None
 
         if action == "ping":
@@ -344,6 +324,11 @@ async def receive_whatsapp_flow(request: Request):
         logger.info("Encrypted response successfully prepared.")
         return PlainTextResponse(content=encrypted_response)
 
+    except HTTPException as http_err:
+        if http_err.status_code == 429:
+            raise
+        logger.exception(f"Error processing WhatsApp flow: {http_err}")
+        raise HTTPException(status_code=400, detail=f"Flow processing failed: {http_err}")
     except Exception as e:
         logger.exception(f"Error processing WhatsApp flow: {e}")
         raise HTTPException(status_code=400, detail=f"Flow processing failed: {e}")
@@ -3,19 +3,22 @@ from fastapi import (
     Response
 )
 from typing import Annotated, List
-from sqlalchemy.orm import Session, joinedload
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update, delete, func, false
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas import Status, StatusCreate, StatusUpdate
-from ..database import get_db
-from ..model import StatusDB, UserDB, ScheduleEnum
+from ..database import get_async_db
+from ..model import StatusDB, UserDB, MAX_STATUSES
+from ..scheduling import now_local, upload_window_active
 from ..tasks import upload_media, delete_media, download_media_logic
+from ..media_store import sha256_bytes
 from app.middlewares import get_rate_limit
 
 import os
 import pathlib
-from datetime import datetime, timedelta
 from uuid import UUID
 import base64
-import pytz
 
 # ---------------- Logging Setup ---------------- #
 from app.logging_config import get_logger
@@ -26,34 +29,89 @@ logger = get_logger(__name__)
 router = APIRouter(prefix="/status/{phone_number}", tags=["Status"])
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
 
-def is_due_by_schedule(schedule: ScheduleEnum, days_diff: int) -> bool:
-    schedule_map = {
-        ScheduleEnum.EVERYDAY.value: 1,
-        ScheduleEnum.EVERY_2_DAYS.value: 2,
-        ScheduleEnum.EVERY_3_DAYS.value: 3,
-        ScheduleEnum.EVERY_4_DAYS.value: 4,
-        ScheduleEnum.EVERY_5_DAYS.value: 5,
-        ScheduleEnum.EVERY_6_DAYS.value: 6,
-        ScheduleEnum.EVERY_WEEK.value: 7,
-        ScheduleEnum.EVERY_10_DAYS.value: 10,
-        ScheduleEnum.EVERY_2_WEEKS.value: 14,
-    }
-    interval = schedule_map.get(schedule, 1)
-    return days_diff % interval == 0
+async def reserve_status_slot(db: AsyncSession, user_id: UUID) -> int | None:
+    """
+    Atomically take one slot of the user's status quota.
+    Returns the new count, or None when the quota is already full.
+    """
+    result = await db.execute(
+        update(UserDB)
+        .where(
+            UserDB.id == user_id,
+            func.coalesce(UserDB.sequence, 0) < MAX_STATUSES
+        )
+        .values(sequence=func.coalesce(UserDB.sequence, 0) + 1)
+        .returning(UserDB.sequence)
+    )
+    return result.scalar_one_or_none()
+
+
+async def release_status_slot(db: AsyncSession, user_id: UUID) -> int | None:
+    """Atomically give back one slot of the user's status quota."""
+    result = await db.execute(
+        update(UserDB)
+        .where(UserDB.id == user_id, UserDB.sequence > 0)
+        .values(sequence=UserDB.sequence - 1)
+        .returning(UserDB.sequence)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_user_by_phone(db: AsyncSession, phone_number: str) -> UserDB | None:
+    result = await db.execute(select(UserDB).filter_by(phone=phone_number))
+    return result.scalars().first()
+
+
+def select_statuses():
+    """
+    Statuses with their user loaded (the response never lazy loads) and
+    whether they are locked by the upload window, computed in the same query.
+    """
+    return (
+        select(StatusDB, upload_window_active(now_local()).label("upload_window_active"))
+        .options(joinedload(StatusDB.user))
+        .execution_options(populate_existing=True)
+    )
+
+
+def with_window_flag(rows) -> list[StatusDB]:
+    statuses = []
+    for current_status, is_active in rows:
+        current_status.upload_window_active = bool(is_active)
+        statuses.append(current_status)
+    return statuses
+
+
+async def get_user_status(db: AsyncSession, status_id: UUID, user_id: UUID) -> StatusDB | None:
+    result = await db.execute(
+        select_statuses().where(StatusDB.id == status_id, StatusDB.user_id == user_id)
+    )
+    statuses = with_window_flag(result.all())
+    return statuses[0] if statuses else None
+
+
+def write_image(file_location: str, image_bytes: bytes):
+    with open(file_location, "wb") as f:
+        f.write(image_bytes)
 
 
 # ---------------- Create Status ---------------- #
 @router.post('', status_code=status.HTTP_201_CREATED, 
              response_model=Status, 
              dependencies=[Depends(get_rate_limit(50, 60))])
-def create_status(
+async def create_status(
     *,
     phone_number: str,
     create_data: StatusCreate,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     try:
-        user = db.query(UserDB).filter_by(phone=phone_number).first()
+        user = await get_user_by_phone(db, phone_number)
+        if not user:
+            raise HTTPException(
+                status.HTTP_404_NOT_FOUND,
+                detail=f"User with id {phone_number} not found"
+            )
         user_id = user.id
 
         write_up = create_data.write_up
@@ -63,6 +121,7 @@ def create_status(
         image = create_data.image
     
         image_path = create_data.images_path
+        media_sha256 = None
         MAIN_DIR = os.path.join(BASE_DIR, str(user_id))
         MEDIA_DIR = os.path.join(MAIN_DIR, 'media')
 
@@ -72,10 +131,10 @@ def create_status(
         if image:
             try:
                 image_bytes = base64.b64decode(image.split(",")[-1])
+                media_sha256 = sha256_bytes(image_bytes)
                 file_name = image_path
                 file_location = os.path.join(MEDIA_DIR, file_name)
-                with open(file_location, "wb") as f:
-                    f.write(image_bytes)
+                await run_in_threadpool(write_image, file_location, image_bytes)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Invalid image data: {e}")
 
@@ -96,43 +155,27 @@ def create_status(
                 detail="Image status must include an image."
             )
 
-        if not user:
-            raise HTTPException(
-                status.HTTP_404_NOT_FOUND,
-                detail=f"User with id {user_id} not found"
-            )
-
         if is_text:
-            prev_status = (
-                db.query(StatusDB)
-                .filter(
+            prev_status = await db.scalar(
+                select(StatusDB.id)
+                .where(
                     StatusDB.user_id == user_id,
                     StatusDB.is_text.is_(True),
                     StatusDB.write_up == write_up.strip()
                 )
-                .first()
+                .limit(1)
             )
         else:
-            prev_status = (
-                db.query(StatusDB)
-                .filter(
+            prev_status = await db.scalar(
+                select(StatusDB.id)
+                .where(
                     StatusDB.user_id == user_id,
-                    StatusDB.is_text.is_(False),
+                    StatusDB.is_text == false(),
                     StatusDB.images_path == image_path.strip()
                 )
-                .first()
+                .limit(1)
             )
 
-        if user.sequence:
-            if user.sequence >= 20:
-                raise HTTPException(
-                    status.HTTP_400_BAD_REQUEST,
-                    detail="Statuses can't exceed 20"
-                )
-            user.sequence += 1
-        else:
-            user.sequence = 1
-
         if prev_status:
             raise HTTPException(
                 status.HTTP_400_BAD_REQUEST,
@@ -144,29 +187,38 @@ def create_status(
             write_up=write_up,
             is_text=is_text,
             images_path=image_path,
+            media_sha256=media_sha256,
             schedule=schedule,
             schedule_time=time
         )
-
         db.add(new_status)
-        db.commit()
-        db.refresh(new_status)
+        await db.flush()
+
+        # Reserve a quota slot last, so the user row is only locked for the commit
+        if await reserve_status_slot(db, user_id) is None:
+            raise HTTPException(
+                status.HTTP_400_BAD_REQUEST,
+                detail=f"Statuses can't exceed {MAX_STATUSES}"
+            )
+
+        await db.commit()
+        new_status = await get_user_status(db, new_status.id, user_id)
         logger.info(f"New status created for user {user_id} (status_id={new_status.id})")
 
         if image_path:
-            upload_media.delay(str(file_location), user_id)
+            await run_in_threadpool(upload_media.delay, str(file_location), user_id, media_sha256)
             logger.info(f"Media upload task triggered for user {user_id}")
 
 
         return new_status
 
     except HTTPException as http_err:
-        db.rollback()
+        await db.rollback()
         logger.error(f"HTTP error while creating status: {http_err.detail}")
         raise http_err
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Unexpected error creating status for user {user_id}: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
 
@@ -174,9 +226,9 @@ def create_status(
 # ---------------- Get Statuses ---------------- #
 @router.get('', response_model=List[Status], 
             dependencies=[Depends(get_rate_limit(50, 60))])
-def get_statuses(phone_number: str, db: Annotated[Session, Depends(get_db)]):
+async def get_statuses(phone_number: str, db: Annotated[AsyncSession, Depends(get_async_db)]):
     try:
-        user = db.query(UserDB).filter_by(phone=phone_number).first()
+        user = await get_user_by_phone(db, phone_number)
         if not user:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
@@ -185,14 +237,13 @@ def get_statuses(phone_number: str, db: Annotated[Session, Depends(get_db)]):
         
         user_id = user.id
 
-        statuses = db.query(StatusDB).filter(
-            StatusDB.user_id == user_id
-        ).options(joinedload(StatusDB.user)).all()
+        result = await db.execute(select_statuses().where(StatusDB.user_id == user_id))
+        statuses = with_window_flag(result.all())
 
         media_dir = os.path.join(BASE_DIR, str(user_id), "media")
         if not os.path.exists(media_dir) or not os.listdir(media_dir):
             logger.info(f"Triggered media download for user {user_id}")
-            download_media_logic(str(BASE_DIR), str(user_id))
+            await run_in_threadpool(download_media_logic, str(BASE_DIR), str(user_id))
 
         logger.info(f"Retrieved {len(statuses)} statuses for user {user_id}")
         return statuses
@@ -209,9 +260,9 @@ def get_statuses(phone_number: str, db: Annotated[Session, Depends(get_db)]):
 @router.delete('/{status_id}', 
                status_code=status.HTTP_204_NO_CONTENT
                , dependencies=[Depends(get_rate_limit(50, 60))])
-def delete_status(phone_number: str, status_id: UUID, db: Annotated[Session, Depends(get_db)]):
+async def delete_status(phone_number: str, status_id: UUID, db: Annotated[AsyncSession, Depends(get_async_db)]):
     try:
-        user = db.query(UserDB).filter_by(phone=phone_number).first()
+        user = await get_user_by_phone(db, phone_number)
         if not user:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
@@ -220,38 +271,29 @@ def delete_status(phone_number: str, status_id: UUID, db: Annotated[Session, Dep
         
         user_id = user.id
 
-        current_status_qs = db.query(StatusDB).filter(
-            StatusDB.id == status_id,
-            StatusDB.user_id == user_id
-        )
-        current_status = current_status_qs.first()
+        current_status = await get_user_status(db, status_id, user_id)
 
         if not current_status:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
                 detail=f"Status with id '{status_id}' not found"
             )
-        
-        timezone = pytz.timezone("Africa/Lagos")
-        now = datetime.now(timezone)
-        start_time = (now - timedelta(minutes=5)).time()
-        end_time = (now + timedelta(minutes=35)).time()
-        days_diff = (now.date() - current_status.created_at.date()).days
 
-        is_within_window = start_time <= current_status.schedule_time <= end_time
-
-        if((is_due_by_schedule(current_status.schedule, days_diff) 
-            or days_diff ==1)
-           and is_within_window) and not current_status.is_upload:
+        if current_status.upload_window_active:
             raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete status — upload in progress or within schedule time."
         )
 
         image_path = current_status.images_path
-        current_status_qs.delete(synchronize_session=False)
-        user.sequence -= 1
-        db.commit()
+        media_sha256 = current_status.media_sha256
+        await db.execute(
+            delete(StatusDB)
+            .where(StatusDB.id == status_id, StatusDB.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        await release_status_slot(db, user_id)
+        await db.commit()
         logger.info(f"Deleted status {status_id} for user {user_id}")
 
         if image_path:
@@ -261,18 +303,18 @@ def delete_status(phone_number: str, status_id: UUID, db: Annotated[Session, Dep
                 user_id_length = len(str(user_id))
                 image_path = image_path[:position+user_id_length] + image_path[position+user_id_length:]
 
-            delete_media.delay(str(image_path), str(user_id))
+            await run_in_threadpool(delete_media.delay, str(image_path), str(user_id), media_sha256)
             logger.info(f"Triggered media deletion for user {user_id}")
 
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     except HTTPException as http_err:
-        db.rollback()
+        await db.rollback()
         logger.error(f"HTTP error deleting status: {http_err.detail}")
         raise http_err
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Unexpected error deleting status {status_id} for user {user_id}: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
 
@@ -281,15 +323,15 @@ def delete_status(phone_number: str, status_id: UUID, db: Annotated[Session, Dep
 @router.put('/{status_id}', 
             response_model=Status, 
             dependencies=[Depends(get_rate_limit(50, 60))])
-def update_status(
+async def update_status(
     *,
     phone_number: str,
     status_id: UUID,
     update_data: StatusUpdate,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     try:
-        user = db.query(UserDB).filter_by(phone=phone_number).first()
+        user = await get_user_by_phone(db, phone_number)
         if not user:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
@@ -298,29 +340,15 @@ def update_status(
         
         user_id = user.id
 
-        current_status_qs = db.query(StatusDB).filter(
-            StatusDB.id == status_id,
-            StatusDB.user_id == user_id
-        )
-        current_status = current_status_qs.first()
+        current_status = await get_user_status(db, status_id, user_id)
 
         if not current_status:
             raise HTTPException(
                 status.HTTP_404_NOT_FOUND,
                 detail=f"Status with id '{status_id}' not found"
             )
-        
-        timezone = pytz.timezone("Africa/Lagos")
-        now = datetime.now(timezone)
-        start_time = (now - timedelta(minutes=5)).time()
-        end_time = (now + timedelta(minutes=35)).time()
-        days_diff = (now.date() - current_status.created_at.date()).days
-
-        is_within_window = start_time <= current_status.schedule_time <= end_time
 
-        if((is_due_by_schedule(current_status.schedule, days_diff) 
-            or days_diff ==1)
-           and is_within_window and not current_status.is_upload):
+        if current_status.upload_window_active:
             raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot update status — upload in progress or within schedule time."
@@ -333,15 +361,15 @@ def update_status(
                 detail="Can not update text-only status with nothing."
                 )
             
-            prev_status = (
-                db.query(StatusDB)
-                .filter(
+            prev_status = await db.scalar(
+                select(StatusDB.id)
+                .where(
                     StatusDB.user_id == user_id,
                     StatusDB.is_text.is_(True),
                     StatusDB.write_up == update_data.write_up.strip(),
                     StatusDB.id != status_id
                 )
-                .first()
+                .limit(1)
             )
 
             if prev_status:
@@ -350,24 +378,29 @@ def update_status(
                     detail="Status already exists"
                 )
 
-        current_status_qs.update({
-            "write_up": update_data.write_up,
-            "schedule": update_data.schedule,
-            "schedule_time": update_data.schedule_time
-        }, synchronize_session=False)
+        await db.execute(
+            update(StatusDB)
+            .where(StatusDB.id == status_id, StatusDB.user_id == user_id)
+            .values(
+                write_up=update_data.write_up,
+                schedule=update_data.schedule,
+                schedule_time=update_data.schedule_time
+            )
+            .execution_options(synchronize_session=False)
+        )
 
-        db.commit()
-        db.refresh(current_status)
+        await db.commit()
+        current_status = await get_user_status(db, status_id, user_id)
         logger.info(f"Updated status {status_id} for user {user_id}")
 
         return current_status
 
     except HTTPException as http_err:
-        db.rollback()
+        await db.rollback()
         logger.error(f"HTTP error updating status: {http_err.detail}")
         raise http_err
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Unexpected error updating status {status_id} for user {user_id}: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
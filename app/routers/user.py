@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from ..schemas import UserCreate, User
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from ..database import get_db
+from ..database import get_async_db
 from ..model import UserDB
 from ..tasks import whatsapp_login_task, upload_profile
 from app.middlewares import get_rate_limit
@@ -28,9 +30,9 @@ BASE_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
     status_code=status.HTTP_201_CREATED,
     response_model=User, dependencies=[Depends(get_rate_limit(50, 60))]
 )
-def create_user(
+async def create_user(
     user: UserCreate,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     """
     Register a new user, initialize local folders,
@@ -38,7 +40,7 @@ def create_user(
     """
     try:
         # Check if the phone number already exists
-        existing_user = db.query(UserDB).filter_by(phone=user.phone).first()
+        existing_user = await db.scalar(select(UserDB.id).filter_by(phone=user.phone))
         if existing_user:
             logger.warning("Attempted registration with existing phone number.")
             raise HTTPException(
@@ -49,8 +51,8 @@ def create_user(
         # Create and save new user
         new_user = UserDB(**user.dict())
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         logger.info(f"User created successfully (UserID={new_user.id}).")
 
         # Prepare directories
@@ -70,10 +72,12 @@ def create_user(
 
         # Schedule WhatsApp login and profile upload via Celery
         try:
-            chain(
-                whatsapp_login_task.si(new_user.phone, new_user.country, PROFILES_DIR),
-                upload_profile.si(main_dir=MAIN_DIR, user_id=new_user.id),
-            ).delay()
+            await run_in_threadpool(
+                chain(
+                    whatsapp_login_task.si(new_user.phone, new_user.country, PROFILES_DIR),
+                    upload_profile.si(main_dir=MAIN_DIR, user_id=new_user.id),
+                ).delay
+            )
             logger.info(f"Background tasks scheduled for user {new_user.id}.")
         except Exception as e:
             logger.error(f"Failed to enqueue background tasks: {e}")
@@ -81,7 +85,7 @@ def create_user(
         return new_user
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error while creating user: {e}")
         raise HTTPException(
             status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -96,4 +100,4 @@ def create_user(
             detail="Unexpected server error during registration."
         )
     finally:
-        db.close()
+        await db.close()
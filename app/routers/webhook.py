@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import hmac
 import hashlib
 from ..config import setting
 from app.middlewares import get_rate_limit
-from ..send_mssg import first_message, wow_flow_mssg, registration_flow_mssg
+from app.rate_limit import rate_limiter
+from app.dedup import message_dedup
+from app.webhook_payload import decode_payload, extract_messages, DecodeError
+from ..tasks import handle_webhook_message
 
 # Configure logger
 from app.logging_config import get_logger
@@ -15,6 +19,7 @@ router = APIRouter(prefix="/webhook", tags=["Webhook"])
 
 VERIFY_TOKEN = setting.verify_token
 APP_SECRET = setting.app_secret
+APP_SECRET_BYTES = APP_SECRET.encode()
 
 
 @router.get("", dependencies=[Depends(get_rate_limit(50, 60))])
@@ -40,51 +45,63 @@ async def verify_webhook(request: Request):
         return JSONResponse(content={"error": "Internal server error"}, status_code=500)
 
 
-@router.post("", dependencies=[Depends(get_rate_limit(50, 60))])
+@router.post("")
 async def receive_webhook(request: Request):
     """
     Handles incoming messages from WhatsApp.
+    Verifies and enqueues the messages, then acknowledges at once; replies are
+    sent by the "webhooks" Celery queue so Graph API latency never reaches Meta.
+    Every delivery comes from Meta, so limits apply per sender, not per request.
     """
     try:
-        signature = request.headers.get("X-Hub-Signature-256")
+        signature = request.headers.get("X-Hub-Signature-256", "")
         body = await request.body()
 
         expected_signature = "sha256=" + hmac.new(
-            APP_SECRET.encode(), body, hashlib.sha256
+            APP_SECRET_BYTES, body, hashlib.sha256
         ).hexdigest()
 
-        if signature != expected_signature:
+        if not hmac.compare_digest(signature.encode(), expected_signature.encode()):
             logger.warning("Invalid signature detected in webhook.")
             return JSONResponse(content={"error": "Invalid signature"}, status_code=403)
 
-        data = await request.json()
+        # The verified bytes are decoded once, straight into typed structs
+        try:
+            payload = decode_payload(body)
+        except DecodeError as e:
+            logger.warning(f"Malformed webhook payload: {e}")
+            return JSONResponse(content={"error": "Malformed payload"}, status_code=400)
         logger.info("Webhook event received successfully.")
 
-        if "entry" in data:
-            for entry in data["entry"]:
-                for change in entry.get("changes", []):
-                    value = change.get("value", {})
-                    contacts = value.get("contacts", [])
-                    messages = value.get("messages", [])
-                    if len(contacts) == len(messages) and contacts:
-                        for index in len(contacts):
-                            contact = contacts[index]
-                            username = contact["profile"]["name"]
-
-                            msg = messages[index]
-                            phone_number = msg.get("from")
-                            logger.info(f"Message received from {username} ({phone_number}).")
-
-                            text = msg.get("text", {})
-                            body = text.get("body", "")
-
-                            if body == "STATUSFLOW":
-                                first_message(phone_number, username)
-                            elif body == "register":
-                                registration_flow_mssg(phone_number)
-                            elif body == "Done":
-                                wow_flow_mssg(phone_number)
-
+        events = extract_messages(payload)
+        new_ids = await message_dedup.first_seen([event["id"] for event in events])
+
+        # Ids claimed above but not enqueued yet; released if the enqueue fails
+        unsent = set(new_ids)
+        try:
+            for event in events:
+                if event["id"] and event["id"] not in new_ids:
+                    logger.info(f"Duplicate delivery of message {event['id']} dropped.")
+                    continue
+
+                phone_number = event["from"]
+                logger.info(f"Message received from {event['name']} ({phone_number}).")
+
+                allowed, _ = rate_limiter.hit(
+                    f"webhook:{phone_number}", setting.webhook_rate_limit, 60
+                )
+                if not allowed:
+                    logger.warning(f"Rate limit exceeded for sender {phone_number}, message ignored.")
+                    await message_dedup.release([event["id"]])
+                    unsent.discard(event["id"])
+                    continue
+
+                await run_in_threadpool(handle_webhook_message.delay, event)
+                unsent.discard(event["id"])
+        except Exception:
+            # Meta redelivers on a 500: let the messages that did not make it through
+            await message_dedup.release(unsent)
+            raise
 
         return JSONResponse(content={"status": "received"}, status_code=200)
 
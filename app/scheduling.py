@@ -0,0 +1,39 @@
+from datetime import date, datetime, timedelta
+import pytz
+from sqlalchemy import Date, and_, cast, false, literal, or_
+
+from app.model import StatusDB
+
+TIMEZONE = pytz.timezone("Africa/Lagos")
+
+# Statuses can't be changed from 5 minutes before to 35 minutes after their slot
+LOCK_BEFORE = timedelta(minutes=5)
+LOCK_AFTER = timedelta(minutes=35)
+
+
+def now_local() -> datetime:
+    return datetime.now(TIMEZONE)
+
+
+def due_on(today: date):
+    """
+    SQL condition: the status posts on `today`, i.e. every `schedule` days
+    since it was created, and always on the day after creation.
+    """
+    days_diff = literal(today, Date) - cast(StatusDB.created_at, Date)
+    return or_(days_diff % StatusDB.schedule == 0, days_diff == 1)
+
+
+def pending_between(today: date, start_time, end_time):
+    """SQL condition: not yet uploaded, due today and scheduled inside [start_time, end_time]."""
+    return and_(
+        # "= false" (not "IS false") so the planner matches the partial index
+        StatusDB.is_upload == false(),
+        StatusDB.schedule_time.between(start_time, end_time),
+        due_on(today),
+    )
+
+
+def upload_window_active(now: datetime):
+    """SQL condition: the status is about to be (or being) posted, so it is locked."""
+    return pending_between(now.date(), (now - LOCK_BEFORE).time(), (now + LOCK_AFTER).time())
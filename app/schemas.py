@@ -40,6 +40,7 @@ class Status(StatusBase):
     is_text: bool = False
     images_path: str | None = None
     is_upload: bool
+    upload_window_active: bool = False
     id: UUID
     created_at: datetime
     user: User
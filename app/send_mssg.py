@@ -1,6 +1,14 @@
 import os
+import random
+import threading
+import time
+
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from .config import setting
+from .rate_limit import TokenBucket
 
 # -----------------------------------
 # Logging Setup
@@ -20,48 +28,150 @@ PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
     logger.error("Missing ACCESS_TOKEN or PHONE_NUMBER_ID in environment variables!")
 
+GRAPH_URL = "https://graph.facebook.com/v22.0/{}/messages"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest the sender sleeps between attempts: it holds a thread of the shared
+# messages worker, so longer waits are left to the Celery countdown retry
+MAX_BACKOFF = 30.0
+
 
 # -----------------------------------
-# Core Send Function
+# Sender
 # -----------------------------------
-def send_mssg(data: dict):
-    url = f"https://graph.facebook.com/v22.0/{PHONE_NUMBER_ID}/messages"
-
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    try:
-        logger.info(f" Sending message to WhatsApp API: {data.j}")
-
-        response = requests.post(url, headers=headers, json=data, timeout=15)
+class WhatsAppSendError(Exception):
+    """The Graph API could not be reached or kept failing after every retry."""
+
+
+class WhatsAppSender:
+    """
+    Outbound Cloud API client shared by every send in the process.
+
+    One keep-alive `requests.Session` (pool sized to the threads sending at
+    once), a token bucket per sending phone number so bursts stay under the
+    Graph API throughput for that number, and retries with full-jitter backoff
+    on 429 and 5xx (honouring Retry-After when the API sends it). Once those
+    retries are spent WhatsAppSendError is raised, so the caller's own retry
+    (the outbound Celery task) takes over.
+    """
+
+    def __init__(
+        self,
+        rate: float = setting.whatsapp_send_rate,
+        burst: int = setting.whatsapp_send_burst,
+        concurrency: int = setting.whatsapp_send_concurrency,
+        max_retries: int = setting.whatsapp_send_retries,
+        timeout: float = 15,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def _reset_if_forked(self):
+        # Sockets do not survive a fork (Celery prefork children)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                    session.mount("https://", adapter)
+                    session.headers.update({
+                        "Authorization": f"Bearer {ACCESS_TOKEN}",
+                        "Content-Type": "application/json",
+                    })
+                    self._session = session
+                    self._buckets = {}
+                    self._pid = os.getpid()
+
+    @property
+    def session(self) -> requests.Session:
+        self._reset_if_forked()
+        return self._session
+
+    def _acquire(self, phone_number_id: str):
+        """Block until the bucket of `phone_number_id` has a token."""
+        while True:
+            with self._lock:
+                bucket = self._buckets.get(phone_number_id)
+                if bucket is None:
+                    bucket = self._buckets[phone_number_id] = TokenBucket(self.burst, self.burst / self.rate)
+                if bucket.take(time.monotonic()):
+                    return
+                wait = bucket.retry_after()
+            time.sleep(wait)
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                if float(retry_after) > MAX_BACKOFF:
+                    raise WhatsAppSendError(
+                        f"WhatsApp API asked to retry after {retry_after}s, leaving it to the queue"
+                    )
+                return float(retry_after)
+        return random.uniform(0, min(MAX_BACKOFF, 0.5 * 2 ** attempt))
+
+    def send(self, data: dict, phone_number_id: str | None = None) -> dict:
+        phone_number_id = phone_number_id or PHONE_NUMBER_ID
+        url = GRAPH_URL.format(phone_number_id)
+        session = self.session
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self._acquire(phone_number_id)
+            try:
+                logger.info(f" Sending {data.get('type')} message to {data.get('to')} (attempt {attempt + 1})")
+
+                response = session.post(url, json=data, timeout=self.timeout)
+
+                logger.info(f" WhatsApp Response Code: {response.status_code}")
+
+                if response.status_code in RETRY_STATUSES:
+                    if last_attempt:
+                        raise WhatsAppSendError(
+                            f"WhatsApp API returned {response.status_code} after {attempt + 1} attempts"
+                        )
+                    delay = self._backoff(attempt, response)
+                    logger.warning(f"WhatsApp API returned {response.status_code}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+
+                # Attempt to parse JSON safely
+                try:
+                    json_data = response.json()
+                except Exception:
+                    logger.error("Failed to parse JSON response")
+                    return {"error": "Invalid JSON response", "status_code": response.status_code}
+
+                if response.status_code >= 400:
+                    logger.error(f"WhatsApp API Error: {json_data}")
+
+                return json_data
+
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if last_attempt:
+                    raise WhatsAppSendError(f"WhatsApp API request failed after {attempt + 1} attempts: {e}") from e
+                delay = self._backoff(attempt)
+                logger.warning(f"WhatsApp API request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+            except requests.exceptions.RequestException as e:
+                raise WhatsAppSendError(f"WhatsApp API Request Error: {e}") from e
+
+
+sender = WhatsAppSender()
 
-        logger.info(f" WhatsApp Response Code: {response.status_code}")
 
-        # Attempt to parse JSON safely
-        try:
-            json_data = response.json()
-        except Exception:
-            logger.error("Failed to parse JSON response")
-            return {"error": "Invalid JSON response", "status_code": response.status_code}
-
-        if response.status_code >= 400:
-            logger.error(f"WhatsApp API Error: {json_data}")
-
-        return json_data
-
-    except requests.exceptions.Timeout:
-        logger.error("WhatsApp API request timed out!")
-        return {"error": "timeout"}
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"WhatsApp API Request Error: {e}")
-        return {"error": str(e)}
-
-    except Exception as e:
-        logger.exception(f"Unexpected error: {e}")
-        return {"error": "unexpected_error"}
+# -----------------------------------
+# Core Send Function
+# -----------------------------------
+def send_mssg(data: dict):
+    return sender.send(data)
 
 
 # -----------------------------------
@@ -0,0 +1,259 @@
+import io
+import mimetypes
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+from .config import setting
+from .crypto import encrypt_file
+from . import gdrive
+from .gdrive import FOLDER_MIME_TYPE, finish_download, prepare_archive
+
+# ---------------- Logging ----------------
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# ---------------- Interface ----------------
+class StorageBackend(ABC):
+    """
+    Where user profiles and media are persisted.
+    Items are addressed by opaque ids; folders and files are both items and
+    listings describe them like Drive does (id, name, mimeType, size, modifiedTime).
+    Backends implement the five primitives; the file helpers below are built on
+    them and may be overridden with something faster.
+    """
+
+    # Id of the top level folder
+    root_id: str = ""
+
+    @abstractmethod
+    def create_folder(self, name: str, parent_id: str | None = None) -> dict:
+        """Create a folder and return its {"id", "name"}."""
+
+    @abstractmethod
+    def list(self, folder_id: str, use_cache: bool = True) -> list[dict]:
+        """Every item directly inside a folder."""
+
+    @abstractmethod
+    def put_stream(self, stream, name: str, folder_id: str | None = None,
+                   size: int | None = None, mime_type: str | None = None) -> dict:
+        """Store the bytes of a readable binary stream as a new file."""
+
+    @abstractmethod
+    def get_stream(self, item_id: str):
+        """Readable binary stream (a context manager) over a file's bytes."""
+
+    @abstractmethod
+    def delete(self, item_ids, parent_id: str | None = None) -> list:
+        """Delete items (folders with their content); return the ids that failed."""
+
+    # ---------------- File helpers ----------------
+    def upload_file(self, file_path: str, folder_id: str | None = None) -> dict:
+        """Encrypt a local file (once, retries reuse the .enc) and store it."""
+        if not file_path.endswith(".enc"):
+            if not os.path.exists(file_path) and os.path.exists(file_path + ".enc"):
+                file_path += ".enc"
+            else:
+                file_path = encrypt_file(file_path)
+
+        with open(file_path, "rb") as f:
+            return self.put_stream(
+                f, os.path.basename(file_path), folder_id, size=os.path.getsize(file_path)
+            )
+
+    def upload_archive(self, local_folder: str, folder_id: str | None = None) -> dict:
+        """Zip a folder and store it as one encrypted file."""
+        return self.upload_file(prepare_archive(local_folder), folder_id)
+
+    def download_file(self, item_id: str, save_file_path: str) -> str:
+        """Fetch a file, then decrypt / unpack it like every download."""
+        part_path = save_file_path + ".part"
+        with self.get_stream(item_id) as source, open(part_path, "wb") as target:
+            shutil.copyfileobj(source, target, gdrive.DOWNLOAD_CHUNK_SIZE)
+        os.replace(part_path, save_file_path)
+        return finish_download(save_file_path)
+
+    def delete_by_name(self, name: str, parent_id: str | None = None) -> list:
+        """Delete the items of a folder named exactly `name`; return the ids deleted."""
+        item_ids = [
+            item["id"] for item in self.list(parent_id or self.root_id, use_cache=False)
+            if item["name"] == name
+        ]
+        failed = set(self.delete(item_ids, parent_id))
+        return [item_id for item_id in item_ids if item_id not in failed]
+
+
+# ---------------- Google Drive ----------------
+class _DriveReader(io.RawIOBase):
+    """Sequential reader over a Drive file, one ranged GET per read."""
+
+    def __init__(self, file_id: str):
+        self._request = gdrive.get_drive_service().files().get_media(fileId=file_id)
+        self._size = int(
+            gdrive.get_drive_service().files().get(fileId=file_id, fields="size").execute().get("size", 0)
+        )
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._pos >= self._size or not len(buffer):
+            return 0
+        end = min(self._pos + len(buffer), self._size) - 1
+        headers = dict(self._request.headers, range=f"bytes={self._pos}-{end}")
+        resp, content = self._request.http.request(self._request.uri, method="GET", headers=headers)
+        if resp.status not in (200, 206):
+            raise HttpError(resp, content, uri=self._request.uri)
+        content = content[:end - self._pos + 1]
+        buffer[:len(content)] = content
+        self._pos += len(content)
+        return len(content)
+
+
+class DriveStorage(StorageBackend):
+    """Google Drive, through the helpers of app.gdrive (authenticates on first use)."""
+
+    root_id = "root"
+
+    def create_folder(self, name, parent_id=None):
+        return gdrive.create_folder(name, parent_id)
+
+    def list(self, folder_id, use_cache=True):
+        return gdrive.list_files_in_folder(folder_id, use_cache)
+
+    def put_stream(self, stream, name, folder_id=None, size=None, mime_type=None):
+        mime_type = mime_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        metadata = {"name": name}
+        if folder_id:
+            metadata["parents"] = [folder_id]
+        resumable = size is None or size >= gdrive.UPLOAD_THRESHOLD
+        media = MediaIoBaseUpload(stream, mimetype=mime_type, resumable=resumable,
+                                  chunksize=20 * 1024 * 1024)
+        uploaded = gdrive.get_drive_service().files().create(
+            body=metadata, media_body=media, fields="id, name"
+        ).execute()
+        gdrive.invalidate_folder_cache(folder_id)
+        return uploaded
+
+    def get_stream(self, item_id):
+        return io.BufferedReader(_DriveReader(item_id), buffer_size=gdrive.DOWNLOAD_CHUNK_SIZE)
+
+    def delete(self, item_ids, parent_id=None):
+        return gdrive.delete_files(item_ids, parent_id)
+
+    # Resumable uploads, parallel segmented downloads and query based deletes
+    def upload_file(self, file_path, folder_id=None):
+        return gdrive.upload_file(file_path, folder_id)
+
+    def upload_archive(self, local_folder, folder_id=None):
+        return gdrive.upload_zip_file(local_folder, parent_folder_id=folder_id)
+
+    def download_file(self, item_id, save_file_path):
+        return gdrive.download_file(item_id, save_file_path)
+
+    def delete_by_name(self, name, parent_id=None):
+        return gdrive.delete_by_name(name, parent_id)
+
+
+# ---------------- Local filesystem ----------------
+class LocalStorage(StorageBackend):
+    """
+    A directory tree (local disk or an NFS mount). Ids are paths relative to
+    the root, so they stay valid across processes and hosts sharing the mount.
+    """
+
+    root_id = ""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, item_id: str | None) -> str:
+        path = os.path.normpath(os.path.join(self.root, item_id or ""))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Item {item_id!r} is outside the storage root")
+        return path
+
+    def _id(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def create_folder(self, name, parent_id=None):
+        path = self._path(os.path.join(parent_id or "", name))
+        os.makedirs(path, exist_ok=True)
+        return {"id": self._id(path), "name": name}
+
+    def list(self, folder_id, use_cache=True):
+        items = []
+        with os.scandir(self._path(folder_id)) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                item = {
+                    "id": self._id(entry.path),
+                    "name": entry.name,
+                    "modifiedTime": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                }
+                if entry.is_dir():
+                    item["mimeType"] = FOLDER_MIME_TYPE
+                else:
+                    item["mimeType"] = mimetypes.guess_type(entry.name)[0] or "application/octet-stream"
+                    item["size"] = str(stat.st_size)
+                items.append(item)
+        return items
+
+    def put_stream(self, stream, name, folder_id=None, size=None, mime_type=None):
+        path = self._path(os.path.join(folder_id or "", name))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as target:
+            shutil.copyfileobj(stream, target, gdrive.DOWNLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, path)
+        return {"id": self._id(path), "name": name}
+
+    def get_stream(self, item_id):
+        return open(self._path(item_id), "rb")
+
+    def delete(self, item_ids, parent_id=None):
+        failed = []
+        for item_id in dict.fromkeys(item_ids):
+            path = self._path(item_id)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                logger.info(f"Storage item {item_id} already gone")
+            except OSError as e:
+                failed.append(item_id)
+                logger.error(f"Failed to delete storage item {item_id}: {e}")
+        return failed
+
+
+# ---------------- Selection ----------------
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """The configured backend (STORAGE_BACKEND=drive|local), created once per process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if setting.storage_backend == "local":
+                root = setting.local_storage_root or os.path.join(gdrive.VOLUME_PATH, "storage")
+                _storage = LocalStorage(root)
+            elif setting.storage_backend == "drive":
+                _storage = DriveStorage()
+            else:
+                raise ValueError(f"Unknown storage backend: {setting.storage_backend}")
+            logger.info(f"Using {type(_storage).__name__}")
+        return _storage
@@ -1,22 +1,23 @@
 import os
 import pathlib
 import shutil
-from datetime import datetime, timedelta
-import pytz
+from datetime import timedelta
 from email.mime.text import MIMEText
 import smtplib
 from dotenv import load_dotenv
 
 from celery import chain
+from sqlalchemy import true, update
 from .celery_app import celery_app
 from .post_status import send_status_images, send_status_texts
+from .outbound import queue_message, BULK
 from app.database import sessionLocal
-from app.model import StatusDB, ScheduleEnum, UserDB
+from app.model import StatusDB, UserDB
+from app.scheduling import now_local, pending_between
 from .whatsapp_login import login_or_restore
-from .gdrive import (
-    upload_folder, upload_file, list_files_in_folder,
-    delete_by_name, download_folder
-)
+from .storage import get_storage, FOLDER_MIME_TYPE
+from .transfer import upload_folder, download_folder, clear_download_checkpoint
+from .media_store import put_media, fetch_media, release_media, blob_file_ids, collect_orphans
 
 # Setup logging
 from app.logging_config import get_logger
@@ -28,25 +29,51 @@ load_dotenv()
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
 
 
-def is_due_by_schedule(schedule: ScheduleEnum, days_diff: int) -> bool:
-    schedule_map = {
-        ScheduleEnum.EVERYDAY.value: 1,
-        ScheduleEnum.EVERY_2_DAYS.value: 2,
-        ScheduleEnum.EVERY_3_DAYS.value: 3,
-        ScheduleEnum.EVERY_4_DAYS.value: 4,
-        ScheduleEnum.EVERY_5_DAYS.value: 5,
-        ScheduleEnum.EVERY_6_DAYS.value: 6,
-        ScheduleEnum.EVERY_WEEK.value: 7,
-        ScheduleEnum.EVERY_10_DAYS.value: 10,
-        ScheduleEnum.EVERY_2_WEEKS.value: 14,
-    }
-    interval = schedule_map.get(schedule, 1)
-    return days_diff % interval == 0
+def get_media_folder_id(db, user: UserDB) -> str:
+    """
+    Storage id of the user's "media" folder, stored on the user.
+    Only the first call per main folder touches storage: it finds the folder by
+    name (profiles uploaded with a media directory) or creates it.
+    """
+    if user.media_folder_id:
+        return user.media_folder_id
+
+    storage = get_storage()
+    media_folder_id = next(
+        (
+            item["id"] for item in storage.list(user.main_folder_id)
+            if item.get("mimeType") == FOLDER_MIME_TYPE and item.get("name") == "media"
+        ),
+        None,
+    )
+    created = media_folder_id is None
+    if created:
+        media_folder_id = storage.create_folder("media", user.main_folder_id)["id"]
+
+    # First writer wins, so concurrent tasks all end up with the same folder
+    stored = db.execute(
+        update(UserDB)
+        .where(UserDB.id == user.id, UserDB.media_folder_id.is_(None))
+        .values(media_folder_id=media_folder_id)
+        .returning(UserDB.media_folder_id)
+    ).scalar_one_or_none()
+    db.commit()
+
+    if stored is None:
+        db.refresh(user)
+        if created and user.media_folder_id != media_folder_id:
+            storage.delete([media_folder_id], user.main_folder_id)
+            logger.info(f"Removed duplicate media folder for user {user.id}")
+        return user.media_folder_id
+
+    logger.info(f"Stored media folder {media_folder_id} for user {user.id}")
+    return media_folder_id
 
 
 @celery_app.task(bind=True, max_retries=3)
 def post_status(self, MAIN_DIR, status_ids: list[int]):
     db = sessionLocal()
+    browser = None
     try:
         logger.info(f"Posting statuses {status_ids} from MAIN_DIR {MAIN_DIR}")
 
@@ -57,47 +84,66 @@ def post_status(self, MAIN_DIR, status_ids: list[int]):
 
         write_ups = []
         image_statuses = []
-        user = None
 
         for status in statuses:
-            user = db.query(UserDB).filter_by(id=status.user_id).first()
             if status.is_text:
                 write_ups.append(status.write_up)
             else:
                 image_statuses.append((status.images_path, status.write_up))
 
+        # Content-addressed images are not in the main folder, fetch the missing ones
+        blob_ids = blob_file_ids(db, (status.media_sha256 for status in statuses))
+        missing_media = [
+            (blob_ids[status.media_sha256], status.images_path)
+            for status in statuses
+            if status.media_sha256 in blob_ids and not os.path.exists(status.images_path)
+        ]
+
+        user = db.query(UserDB).filter_by(id=statuses[0].user_id).first()
         if not user:
             logger.error("No user found for given statuses")
             return
-        
-        browser, wait, re_uploading = login_or_restore(user.phone, user.country, str(os.path.join(MAIN_DIR, "profiles")), for_status=True)
+        user_id, phone, country = user.id, user.phone, user.country
+
+        # Give the connection back to the pool while the browser runs (minutes)
+        db.close()
+
+        for file_id, image_path in missing_media:
+            fetch_media(file_id, image_path)
+
+        browser, wait, re_uploading = login_or_restore(phone, country, str(os.path.join(MAIN_DIR, "profiles")), for_status=True)
 
         if image_statuses:
-            logger.info(f"Sending {len(image_statuses)} image statuses for {user.phone} ({user.country})")
-            send_status_images(image_statuses, user.phone, user.country, browser, wait)
+            logger.info(f"Sending {len(image_statuses)} image statuses for {phone} ({country})")
+            send_status_images(image_statuses, phone, country, browser, wait)
         if write_ups:
-            logger.info(f"Sending {len(write_ups)} text statuses for {user.phone} ({user.country})")
-            send_status_texts(write_ups, user.phone, user.country, browser, wait)
+            logger.info(f"Sending {len(write_ups)} text statuses for {phone} ({country})")
+            send_status_texts(write_ups, phone, country, browser, wait)
 
-        for status in statuses:
-            status.is_upload = True
+        db.query(StatusDB).filter(StatusDB.id.in_(status_ids)).update(
+            {"is_upload": True}, synchronize_session=False
+        )
         db.commit()
         logger.info("Statuses marked as uploaded. Waiting before closing browser...")
 
         try:
             browser.quit()
-            logger.info("Browser closed successfully after sending statuses for %s (%s)", user.phone, user.country)
+            logger.info("Browser closed successfully after sending statuses for %s (%s)", phone, country)
         except Exception as e:
             logger.error(f"Failed to close browser: {e}", exc_info=True)
 
         if re_uploading:
-            return {"MAIN_DIR": MAIN_DIR, "user_id": user.id}
+            return {"MAIN_DIR": MAIN_DIR, "user_id": user_id}
         else:
             return {"MAIN_DIR": MAIN_DIR}
 
     except Exception as e:
         db.rollback()
-        browser.quit()
+        if browser is not None:
+            try:
+                browser.quit()
+            except Exception as quit_error:
+                logger.error(f"Failed to close browser: {quit_error}", exc_info=True)
         logger.error(f"Error posting status: {e}", exc_info=True)
         self.retry(exc=e, countdown=30)
     finally:
@@ -110,20 +156,16 @@ def schedule_status_task(self):
     try:
         logger.info("Running schedule_status_task")
 
-        timezone = pytz.timezone("Africa/Lagos")
-        now = datetime.now(timezone)
+        now = now_local()
         start_time = now.time()
         end_time = (now + timedelta(minutes=30)).time()
 
         logger.info(f"Checking statuses scheduled between {start_time} and {end_time}")
 
-        # Query directly from Status table (avoid heavy join)
+        # Window and schedule are both checked in SQL, only due ids come back
         due_statuses = (
-            db.query(StatusDB)
-            .filter(
-                StatusDB.is_upload.is_(False),
-                StatusDB.schedule_time.between(start_time, end_time)
-            )
+            db.query(StatusDB.user_id, StatusDB.id)
+            .filter(pending_between(now.date(), start_time, end_time))
             .all()
         )
 
@@ -133,10 +175,8 @@ def schedule_status_task(self):
 
         # Group statuses by user
         user_map = {}
-        for status in due_statuses:
-            days_diff = (now.date() - status.created_at.date()).days 
-            if is_due_by_schedule(status.schedule, days_diff) or days_diff == 1:
-                user_map.setdefault(status.user_id, []).append(status.id)
+        for user_id, status_id in due_statuses:
+            user_map.setdefault(user_id, []).append(status_id)
 
         logger.info(f"Found {len(user_map)} users with scheduled statuses.")
 
@@ -168,6 +208,7 @@ def delete_main_dir(self, post_status_result: dict):
             MAIN_DIR += "_uploading"
 
         shutil.rmtree(MAIN_DIR)
+        clear_download_checkpoint(MAIN_DIR)
         logger.info(f"Cleaned up MAIN_DIR {MAIN_DIR}")
 
 
@@ -177,12 +218,11 @@ def update_is_uploaded(self):
     db = sessionLocal()
     try:
         logger.info("Resetting is_upload flag for all statuses")
-        statuses = db.query(StatusDB).filter(
-            StatusDB.is_upload.is_(True)
-        ).all()
-        for status in statuses:
-            status.is_upload = False
+        reset = db.query(StatusDB).filter(
+            StatusDB.is_upload == true()
+        ).update({"is_upload": False}, synchronize_session=False)
         db.commit()
+        logger.info(f"Reset is_upload on {reset} statuses")
     except Exception as e:
         db.rollback()
         logger.error(f"Error updating is_upload: {e}", exc_info=True)
@@ -271,6 +311,8 @@ def upload_profile(self, main_dir, user_id):
         folder = upload_folder(main_dir)
 
         user.main_folder_id = folder.get("id")
+        # The media folder now lives under the new main folder, resolve it again
+        user.media_folder_id = None
         db.commit()
         logger.info("Profile uploaded successfully")
     except Exception as e:
@@ -282,24 +324,16 @@ def upload_profile(self, main_dir, user_id):
 
 
 @celery_app.task(bind=True, max_retries=3)
-def upload_media(self, media_file, user_id):
+def upload_media(self, media_file, user_id, sha256=None):
     db = sessionLocal()
     try:
         logger.info(f"Uploading media {media_file} for user {user_id}")
-        user = db.query(UserDB).filter(UserDB.id == user_id).first()
-
-        items = list_files_in_folder(user.main_folder_id)
-        media_folder_id = None
-        for item in items:
-            if item["mimeType"] == "application/vnd.google-apps.folder" and item["name"] == "media":
-                media_folder_id = item["id"]
-                break
-
-        if not media_folder_id:
-            media_folder = upload_folder("media", user.main_folder_id)
-            media_folder_id = media_folder.get("id")
-
-        upload_file(media_file, media_folder_id)
+        if sha256:
+            put_media(db, media_file, sha256)
+        else:
+            user = db.query(UserDB).filter(UserDB.id == user_id).first()
+            media_folder_id = get_media_folder_id(db, user)
+            get_storage().upload_file(media_file, media_folder_id)
 
         MAIN_DIR = os.path.join(BASE_DIR, str(user_id))
         
@@ -316,31 +350,22 @@ def upload_media(self, media_file, user_id):
 
 
 @celery_app.task(bind=True, max_retries=3)
-def delete_media(self, media_file, user_id):
+def delete_media(self, media_file, user_id, sha256=None):
     db = sessionLocal()
     try:
         logger.info(f"Deleting media {media_file} for user {user_id}")
-        user = db.query(UserDB).filter(UserDB.id == user_id).first()
-
-        items = list_files_in_folder(user.main_folder_id)
-        media_folder_id = None
-
-        for item in items:
-            if (
-                item.get("mimeType") == "application/vnd.google-apps.folder"
-                and item.get("name") == "media"
-            ):
-                media_folder_id = item.get("id")
-                break
+        if sha256:
+            # Shared blob: only goes once the last status using it is gone
+            release_media(db, sha256)
+            return
 
-        if not media_folder_id:
-            media_folder = upload_folder("media", user.main_folder_id)
-            media_folder_id = media_folder.get("id")
+        user = db.query(UserDB).filter(UserDB.id == user_id).first()
+        media_folder_id = get_media_folder_id(db, user)
 
         name = os.path.basename(media_file)
         if not name.endswith(".enc"):
             name += ".enc"
-        delete_by_name(name, media_folder_id)
+        get_storage().delete_by_name(name, media_folder_id)
         logger.info("Media deleted successfully")
     except Exception as e:
         logger.error(f"Error in delete_media: {e}", exc_info=True)
@@ -353,22 +378,16 @@ def download_media_logic(BASE_DIR, user_id):
     try:
         logger.info(f"Downloading media for user {user_id}")
         user = db.query(UserDB).filter(UserDB.id == user_id).first()
+        media_folder_id = get_media_folder_id(db, user)
 
-        items = list_files_in_folder(user.main_folder_id)
-        media_folder_id = None
-
-        for item in items:
-            if (
-                item.get("mimeType") == "application/vnd.google-apps.folder"
-                and item.get("name") == "media"
-            ):
-                media_folder_id = item.get("id")
-                break
-
+        # Content-addressed images live in the shared blob folder
+        images = db.query(StatusDB.images_path, StatusDB.media_sha256).filter(
+            StatusDB.user_id == user_id, StatusDB.media_sha256.isnot(None)
+        ).all()
+        blob_ids = blob_file_ids(db, (sha256 for _, sha256 in images))
 
-        if not media_folder_id:
-            media_folder = upload_folder("media", user.main_folder_id)
-            media_folder_id = media_folder.get("id")
+        # Give the connection back to the pool while the transfer runs (minutes)
+        db.close()
 
         MAIN_DIR = os.path.join(BASE_DIR, str(user_id))
         MEDIA_DIR = os.path.join(MAIN_DIR, "media")
@@ -376,6 +395,11 @@ def download_media_logic(BASE_DIR, user_id):
         os.makedirs(MEDIA_DIR, exist_ok=True)
 
         download_folder(media_folder_id, MEDIA_DIR)
+
+        for image_path, sha256 in images:
+            save_path = os.path.join(MEDIA_DIR, os.path.basename(image_path))
+            if sha256 in blob_ids and not os.path.exists(save_path):
+                fetch_media(blob_ids[sha256], save_path)
         logger.info("Media downloaded successfully")
 
         return True
@@ -388,7 +412,6 @@ def download_media_logic(BASE_DIR, user_id):
 
 @celery_app.task(bind=True, max_retries=3)
 def download_media(self, BASE_DIR, user_id):
-    db = sessionLocal()
     try:
         result = download_media_logic(BASE_DIR, user_id)
         if not result:
@@ -397,8 +420,6 @@ def download_media(self, BASE_DIR, user_id):
     except Exception as e:
         logger.error(f"Error in download_media: {e}", exc_info=True)
         self.retry(exc=e, countdown=30)
-    finally:
-        db.close()
 
 
 @celery_app.task(bind=True, max_retries=3)
@@ -421,6 +442,39 @@ def download_user_main_folder(self, user_id):
         db.close()
 
 
+@celery_app.task(bind=True, max_retries=3)
+def collect_media_blobs(self):
+    db = sessionLocal()
+    try:
+        removed = collect_orphans(db)
+        logger.info(f"Removed {removed} unreferenced media blobs")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error in collect_media_blobs: {e}", exc_info=True)
+        self.retry(exc=e, countdown=300)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, max_retries=3)
+def handle_webhook_message(self, event: dict):
+    """Reply to one incoming WhatsApp message (routed to the "webhooks" queue)."""
+    try:
+        body = event.get("body", "")
+        phone_number = event.get("from")
+
+        # Replies share the outbound queue, behind verification codes
+        if body == "STATUSFLOW":
+            queue_message("first_message", phone_number, event.get("name"), priority=BULK)
+        elif body == "register":
+            queue_message("registration_flow_mssg", phone_number, priority=BULK)
+        elif body == "Done":
+            queue_message("wow_flow_mssg", phone_number, priority=BULK)
+    except Exception as e:
+        logger.error(f"Error handling webhook message {event.get('id')}: {e}", exc_info=True)
+        self.retry(exc=e, countdown=5)
+
+
 @celery_app.task(bind=True, max_retries=3)
 def send_error_email(self, subject: str, message: str):
     """
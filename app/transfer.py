@@ -0,0 +1,470 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import humanize
+from googleapiclient.errors import HttpError
+
+from .checkpoints import TreeCheckpoint
+from .gdrive import MAX_WORKERS
+from .storage import FOLDER_MIME_TYPE, get_storage
+
+# ---------------- Logging ----------------
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# ---------------- Config ----------------
+# One bounded pool per process for every folder transfer, whatever the tree depth.
+# The pool is sized for the ceiling; AdaptiveLimiter decides how many run at once.
+TRANSFER_WORKERS = int(os.environ.get("DRIVE_TRANSFER_WORKERS", MAX_WORKERS))
+TRANSFER_MIN_WORKERS = int(os.environ.get("DRIVE_TRANSFER_MIN_WORKERS", 1))
+TRANSFER_MAX_WORKERS = max(
+    TRANSFER_WORKERS, int(os.environ.get("DRIVE_TRANSFER_MAX_WORKERS", 4 * MAX_WORKERS))
+)
+
+# Retry of throttled calls: full jitter exponential backoff
+TRANSFER_MAX_RETRIES = int(os.environ.get("DRIVE_TRANSFER_MAX_RETRIES", 6))
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 64.0  # seconds
+
+# 403 reasons Drive uses for quota / transient backend trouble
+THROTTLE_REASONS = {"userRateLimitExceeded", "rateLimitExceeded", "backendError", "internalError"}
+
+_pool = None
+_limiter = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _ensure_process_state():
+    global _pool, _limiter, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=TRANSFER_MAX_WORKERS, thread_name_prefix="drive-transfer")
+            _limiter = AdaptiveLimiter(TRANSFER_WORKERS, TRANSFER_MIN_WORKERS, TRANSFER_MAX_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool, _limiter
+
+
+def get_transfer_pool() -> ThreadPoolExecutor:
+    """Process-wide transfer pool, created lazily (and again after a fork)."""
+    return _ensure_process_state()[0]
+
+
+def get_transfer_limiter() -> "AdaptiveLimiter":
+    """Process-wide concurrency limiter shared by every transfer."""
+    return _ensure_process_state()[1]
+
+
+# ---------------- Adaptive concurrency ----------------
+def is_throttled(error: Exception) -> bool:
+    """True for Drive responses that mean "slow down": 429, 5xx and rate-limit 403s."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        reasons = {detail.get("reason") for detail in (error.error_details or []) if isinstance(detail, dict)}
+        return bool(reasons & THROTTLE_REASONS) or "rateLimitExceeded" in str(error)
+    return False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on concurrent Drive transfers.
+    Every round of `limit` completions the limit grows by one if throughput
+    did not drop; a throttled response halves it. Throttles from calls started
+    before the last decrease are ignored, so one burst only backs off once.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 20):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._round_started = time.monotonic()
+        self._round_done = 0
+        self._round_bytes = 0
+        self._round_throttled = False
+        self._last_rate = 0.0
+
+    def acquire(self) -> float:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def reserve(self, wanted: int) -> int:
+        """Take up to `wanted` free slots without waiting; returns how many were taken."""
+        with self._cond:
+            granted = max(0, min(wanted, self.limit - self.in_flight))
+            self.in_flight += granted
+            return granted
+
+    def unreserve(self, count: int):
+        with self._cond:
+            self.in_flight -= count
+            self._cond.notify_all()
+
+    def release(self, started: float, nbytes: int = 0, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(started)
+            else:
+                self._record(nbytes)
+            self._cond.notify_all()
+
+    def _decrease(self, started: float):
+        self._round_throttled = True
+        if started < self._last_decrease:
+            return
+        old = self.limit
+        self.limit = max(self.minimum, self.limit // 2)
+        self._last_decrease = time.monotonic()
+        logger.warning(f"Drive throttled: transfer concurrency {old} -> {self.limit}")
+
+    def _record(self, nbytes: int):
+        self._round_done += 1
+        self._round_bytes += nbytes
+        if self._round_done < self.limit:
+            return
+
+        now = time.monotonic()
+        elapsed = now - self._round_started
+        rate = self._round_bytes / elapsed if elapsed else 0.0
+        if not self._round_throttled and rate >= self._last_rate * 0.95 and self.limit < self.maximum:
+            self.limit += 1
+            logger.info(
+                f"Transfer concurrency -> {self.limit} ({humanize.naturalsize(rate)}/s)"
+            )
+        self._last_rate = rate
+        self._round_started = now
+        self._round_done = 0
+        self._round_bytes = 0
+        self._round_throttled = False
+
+
+def run_limited(fn, *args, size: int = 0, **kwargs):
+    """
+    Run one Drive call under the shared limiter.
+    Throttled calls shrink the limit and are retried with full jitter backoff;
+    any other error is raised straight away.
+    """
+    limiter = get_transfer_limiter()
+    for attempt in range(TRANSFER_MAX_RETRIES + 1):
+        started = limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttled(e)
+            limiter.release(started, throttled=throttled)
+            if not throttled or attempt == TRANSFER_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            logger.warning(
+                f"{getattr(fn, '__name__', fn)} throttled (attempt {attempt + 1}/{TRANSFER_MAX_RETRIES}), "
+                f"retrying in {delay:.1f}s: {e}"
+            )
+            time.sleep(delay)
+        else:
+            limiter.release(started, nbytes=size)
+            return result
+
+
+class TransferProgress:
+    """Aggregate progress and throughput of one folder transfer."""
+
+    def __init__(self, label: str, total_files: int, total_bytes: int = 0):
+        self.label = label
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.failed_files = 0
+        self.done_bytes = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def file_done(self, size: int = 0, ok: bool = True):
+        with self._lock:
+            self.done_files += 1
+            if ok:
+                self.done_bytes += size
+            else:
+                self.failed_files += 1
+            done_files, done_bytes = self.done_files, self.done_bytes
+
+        elapsed = time.monotonic() - self.started
+        percent = done_files / self.total_files * 100 if self.total_files else 100.0
+        rate = done_bytes / elapsed if elapsed else 0
+        logger.info(
+            f"{self.label}: {done_files}/{self.total_files} files ({percent:.1f}%), "
+            f"{humanize.naturalsize(done_bytes)} / {humanize.naturalsize(self.total_bytes)} "
+            f"at {humanize.naturalsize(rate)}/s"
+        )
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.done_bytes / elapsed if elapsed else 0
+        return (
+            f"{self.label}: {self.done_files - self.failed_files}/{self.total_files} files, "
+            f"{self.failed_files} failed, {humanize.naturalsize(self.done_bytes)} "
+            f"in {elapsed:.1f}s ({humanize.naturalsize(rate)}/s)"
+        )
+
+
+# ---------------- Upload ----------------
+def _plan_upload(folder_path):
+    """
+    Flatten a local tree into folder levels (parents before children) and files.
+    "profiles" directories are uploaded as one encrypted zip, never walked.
+    Leftovers of interrupted transfers (archives, .part and .enc.tmp files) are not files of the tree.
+    """
+    levels, files = [], []
+    current = [folder_path]
+    while current:
+        levels.append(current)
+        next_level = []
+        for directory in current:
+            items = os.listdir(directory)
+            leftovers = {
+                f"{item}_backup.zip{suffix}"
+                for item in items if item.lower() == "profiles"
+                for suffix in ("", ".enc")
+            }
+            for item in items:
+                if item in leftovers or item.endswith((".part", ".part.json", ".enc.tmp")):
+                    continue
+                item_path = os.path.join(directory, item)
+                if os.path.isfile(item_path):
+                    files.append(("file", item_path, directory, os.path.getsize(item_path)))
+                elif item.lower() == "profiles":
+                    files.append(("zip", item_path, directory, 0))
+                elif os.path.isdir(item_path):
+                    next_level.append(item_path)
+        current = next_level
+    return levels, files
+
+
+def _upload_field(kind, path, folder_path):
+    """Checkpoint field of a planned item; files count as done once encrypted and sent."""
+    relative = os.path.relpath(path, folder_path)
+    if kind == "file" and not relative.endswith(".enc"):
+        relative += ".enc"
+    return f"{kind}:{relative}"
+
+
+def _create_folder_checkpointed(checkpoint, field, name, parent_id):
+    folder = run_limited(get_storage().create_folder, name, parent_id)
+    checkpoint.mark(field, folder["id"])
+    return folder
+
+
+def _upload_checkpointed(checkpoint, field, fn, *args, **kwargs):
+    uploaded = run_limited(fn, *args, **kwargs)
+    checkpoint.mark(field, uploaded["id"])
+    return uploaded
+
+
+def upload_folder(folder_path, parent_folder_id=None):
+    """Upload a local folder tree to Google Drive on the shared transfer pool.
+    Deletes the local folder ONLY if every upload is successful.
+    A retry reuses the Drive folders and skips the files a previous attempt sent."""
+    folder_name = os.path.basename(folder_path)
+    if folder_name.endswith("_uploading"):
+        folder_name = folder_name[:-10]
+
+    pool = get_transfer_pool()
+    storage = get_storage()
+    checkpoint = TreeCheckpoint("upload", os.path.abspath(folder_path), parent_folder_id)
+    done = checkpoint.load()
+    if done:
+        logger.info(f"Resuming upload of {folder_path}: {len(done)} items already on Drive")
+
+    try:
+        levels, files = _plan_upload(folder_path)
+
+        # --- Create Drive folders, one level at a time ---
+        root_field = _upload_field("dir", folder_path, folder_path)
+        if root_field in done:
+            root = {"id": done[root_field], "name": folder_name}
+        else:
+            root = _create_folder_checkpointed(checkpoint, root_field, folder_name, parent_folder_id)
+        drive_ids = {folder_path: root["id"]}
+        for level in levels[1:]:
+            futures = {}
+            for path in level:
+                field = _upload_field("dir", path, folder_path)
+                if field in done:
+                    drive_ids[path] = done[field]
+                    continue
+                future = pool.submit(
+                    _create_folder_checkpointed, checkpoint, field,
+                    os.path.basename(path), drive_ids[os.path.dirname(path)]
+                )
+                futures[future] = path
+            for future in as_completed(futures):
+                drive_ids[futures[future]] = future.result()["id"]
+
+        # --- Upload every file of the tree concurrently ---
+        pending = [item for item in files if _upload_field(item[0], item[1], folder_path) not in done]
+        progress = TransferProgress(
+            f"Upload {folder_name}", len(pending), sum(size for *_, size in pending)
+        )
+        futures = {}
+        for kind, path, parent, size in pending:
+            field = _upload_field(kind, path, folder_path)
+            if kind == "zip":
+                future = pool.submit(
+                    _upload_checkpointed, checkpoint, field,
+                    storage.upload_archive, path, drive_ids[parent]
+                )
+            else:
+                future = pool.submit(
+                    _upload_checkpointed, checkpoint, field,
+                    storage.upload_file, path, drive_ids[parent], size=size
+                )
+            futures[future] = (path, size)
+
+        uploaded_successfully = True
+        for future in as_completed(futures):
+            path, size = futures[future]
+            try:
+                future.result()
+                progress.file_done(size)
+            except Exception as e:
+                uploaded_successfully = False
+                progress.file_done(size, ok=False)
+                logger.error(f" File upload error for {path}: {e}")
+
+        logger.info(progress.summary())
+
+        # --- Delete only if EVERYTHING succeeded ---
+        if uploaded_successfully:
+            checkpoint.clear()
+            try:
+                logger.info(f" All uploads successful. Deleting {folder_path}")
+                shutil.rmtree(folder_path)
+                clear_download_checkpoint(folder_path)
+                logger.info(f" Deleted local folder: {folder_path}")
+            except Exception as cleanup_error:
+                logger.warning(f" Could not delete folder {folder_path}: {cleanup_error}")
+        else:
+            logger.warning(f" Upload incomplete. Keeping folder {folder_path} for retry.")
+
+        return root
+
+    except Exception as e:
+        logger.error(f" Failed to upload folder {folder_path}: {e}", exc_info=True)
+        raise
+
+
+# ---------------- Download ----------------
+def _plan_download(folder_id, save_folder_path):
+    """
+    Walk a Drive tree breadth first, listing each level's folders concurrently.
+    Returns every file as (file_id, name, size, modified_time, local_dir).
+    """
+    pool = get_transfer_pool()
+    storage = get_storage()
+    files = []
+    current = [(folder_id, save_folder_path)]
+    while current:
+        futures = {
+            # Always list fresh: the files may have been written by another worker
+            pool.submit(run_limited, storage.list, drive_id, False): local_dir
+            for drive_id, local_dir in current
+        }
+        next_level = []
+        for future in as_completed(futures):
+            local_dir = futures[future]
+            os.makedirs(local_dir, exist_ok=True)
+            for item in future.result():
+                if item["mimeType"] == FOLDER_MIME_TYPE:
+                    next_level.append((item["id"], os.path.join(local_dir, item["name"])))
+                else:
+                    files.append((
+                        item["id"], item["name"], int(item.get("size", 0)),
+                        item.get("modifiedTime", ""), local_dir
+                    ))
+        current = next_level
+    return files
+
+
+def _download_checkpoint(save_folder_path):
+    return TreeCheckpoint("download", os.path.abspath(save_folder_path))
+
+
+def _already_downloaded(done, file_id, modified_time):
+    """Unchanged on Drive since it was fetched, and what it became is still on disk."""
+    try:
+        fetched_time, output_path = json.loads(done[file_id])
+    except (KeyError, ValueError, TypeError):
+        return False
+    return fetched_time == modified_time and os.path.exists(output_path)
+
+
+def _download_checkpointed(checkpoint, file_id, modified_time, save_file_path, size):
+    # The decrypted / unpacked output is recorded, not the downloaded name
+    output_path = run_limited(get_storage().download_file, file_id, save_file_path, size=size)
+    checkpoint.mark(file_id, json.dumps([modified_time, os.path.abspath(output_path)]))
+    return output_path
+
+
+def clear_download_checkpoint(save_folder_path):
+    """Forget what was downloaded into a local folder; call when deleting it."""
+    _download_checkpoint(save_folder_path).clear()
+
+
+def download_folder(folder_id, save_folder_path):
+    """Download a Drive folder tree, every file on the shared transfer pool.
+    A retry skips files that are unchanged since a previous attempt fetched them
+    and whose local output still exists."""
+    os.makedirs(save_folder_path, exist_ok=True)
+    files = _plan_download(folder_id, save_folder_path)
+
+    if not files:
+        logger.warning(f"No files found in folder: {folder_id}")
+        return save_folder_path
+
+    checkpoint = _download_checkpoint(save_folder_path)
+    done = checkpoint.load()
+    pending = [item for item in files if not _already_downloaded(done, item[0], item[3])]
+    if len(pending) < len(files):
+        logger.info(f"Resuming download of {folder_id}: {len(files) - len(pending)} files already local")
+
+    pool = get_transfer_pool()
+    progress = TransferProgress(
+        f"Download {os.path.basename(os.path.normpath(save_folder_path))}",
+        len(pending), sum(item[2] for item in pending)
+    )
+    futures = {
+        pool.submit(
+            _download_checkpointed, checkpoint, file_id, modified_time,
+            os.path.join(local_dir, name), size
+        ): (name, size)
+        for file_id, name, size, modified_time, local_dir in pending
+    }
+    downloaded_successfully = True
+    for future in as_completed(futures):
+        name, size = futures[future]
+        try:
+            future.result()
+            progress.file_done(size)
+        except Exception as e:
+            downloaded_successfully = False
+            progress.file_done(size, ok=False)
+            logger.error(f"Failed: {name} | Error: {e}")
+
+    logger.info(progress.summary())
+    if downloaded_successfully:
+        checkpoint.clear()
+    return save_folder_path
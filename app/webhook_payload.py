@@ -0,0 +1,69 @@
+"""
+Typed view of WhatsApp Cloud API webhook deliveries.
+Only the fields the app reads are declared; everything else in the body is
+skipped by the decoder without building Python objects for it.
+"""
+import msgspec
+
+
+class Text(msgspec.Struct):
+    body: str = ""
+
+
+class Message(msgspec.Struct):
+    id: str | None = None
+    sender: str | None = msgspec.field(default=None, name="from")
+    text: Text | None = None
+
+
+class Profile(msgspec.Struct):
+    name: str | None = None
+
+
+class Contact(msgspec.Struct):
+    profile: Profile = msgspec.field(default_factory=Profile)
+
+
+class Value(msgspec.Struct):
+    contacts: list[Contact] = []
+    messages: list[Message] = []
+
+
+class Change(msgspec.Struct):
+    value: Value = msgspec.field(default_factory=Value)
+
+
+class Entry(msgspec.Struct):
+    changes: list[Change] = []
+
+
+class WebhookPayload(msgspec.Struct):
+    entry: list[Entry] = []
+
+
+_decoder = msgspec.json.Decoder(WebhookPayload)
+
+DecodeError = msgspec.DecodeError
+
+
+def decode_payload(body: bytes) -> WebhookPayload:
+    """Parse a raw delivery body once, straight into the structs above."""
+    return _decoder.decode(body)
+
+
+def extract_messages(payload: WebhookPayload) -> list[dict]:
+    """Compact events for the messages of a webhook delivery: id, sender, name and text."""
+    events = []
+    for entry in payload.entry:
+        for change in entry.changes:
+            contacts, messages = change.value.contacts, change.value.messages
+            if len(contacts) != len(messages) or not contacts:
+                continue
+            for contact, msg in zip(contacts, messages):
+                events.append({
+                    "id": msg.id,
+                    "from": msg.sender,
+                    "name": contact.profile.name,
+                    "body": msg.text.body if msg.text else "",
+                })
+    return events
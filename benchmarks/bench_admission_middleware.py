@@ -0,0 +1,109 @@
+"""
+Per-request overhead of the admission-control layer.
+
+Calls a minimal Starlette app straight through the ASGI interface (no sockets,
+no HTTP client) so the numbers are the middleware stack itself:
+
+    none        the bare app
+    base-http   the old shape: two BaseHTTPMiddleware layers doing cached checks
+    asgi        AdmissionControlMiddleware
+
+    python benchmarks/bench_admission_middleware.py --requests 20000
+"""
+import argparse
+import asyncio
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import PlainTextResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.load_monitor import load_sampler, queue_poller  # noqa: E402
+from app.middlewares import AdmissionControlMiddleware  # noqa: E402
+
+
+class CachedLoadCheck(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if load_sampler.overloaded:
+            return PlainTextResponse("overloaded", status_code=503)
+        return await call_next(request)
+
+
+class CachedQueueCheck(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if queue_poller.saturated:
+            return PlainTextResponse("queue full", status_code=503)
+        return await call_next(request)
+
+
+async def home(request):
+    return PlainTextResponse("ok")
+
+
+STACKS = {
+    "none": [],
+    "base-http": [Middleware(CachedLoadCheck), Middleware(CachedQueueCheck)],
+    "asgi": [Middleware(AdmissionControlMiddleware)],
+}
+
+
+def build_app(stack):
+    return Starlette(routes=[Route("/", home)], middleware=stack)
+
+
+async def one_request(app):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/", "raw_path": b"/",
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(app, requests: int, warmup: int):
+    for _ in range(warmup):
+        await one_request(app)
+
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await one_request(app)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    args = parser.parse_args()
+
+    baseline = None
+    for name, stack in STACKS.items():
+        times = asyncio.run(run(build_app(stack), args.requests, args.warmup))
+        mean = statistics.fmean(times) * 1e6
+        p50 = statistics.median(times) * 1e6
+        p99 = statistics.quantiles(times, n=100)[98] * 1e6
+        baseline = baseline or mean
+        print(
+            f"{name:10s} mean={mean:8.1f}us  p50={p50:8.1f}us  p99={p99:8.1f}us  "
+            f"overhead={mean - baseline:+8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Per-file overhead of getting a Drive client: a fresh credentials load plus
+discovery build() for every file (the old get_drive_service) against the
+cached per-thread client.
+
+Each "file" is one files().get metadata call on FOLDER_ID, issued from a
+thread pool the same way upload_folder/download_folder do:
+
+    python benchmarks/bench_drive_client.py FOLDER_ID --files 200 --workers 5
+"""
+import argparse
+import pathlib
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from google.oauth2.credentials import Credentials  # noqa: E402
+from googleapiclient.discovery import build  # noqa: E402
+
+from app import gdrive  # noqa: E402
+
+
+def build_per_call():
+    creds = Credentials.from_authorized_user_file(gdrive.TOKEN_FILE, gdrive.SCOPES)
+    return build("drive", "v3", credentials=creds, cache_discovery=False)
+
+
+def run(get_service, folder_id: str, files: int, workers: int):
+    client_times, total_times = [], []
+
+    def one_file(_):
+        start = time.perf_counter()
+        service = get_service()
+        got_client = time.perf_counter()
+        service.files().get(fileId=folder_id, fields="id").execute()
+        client_times.append(got_client - start)
+        total_times.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one_file, range(files)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "client ms/file": statistics.mean(client_times) * 1000,
+        "total ms/file": statistics.mean(total_times) * 1000,
+        "files/sec": files / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder_id")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=gdrive.MAX_WORKERS)
+    args = parser.parse_args()
+
+    for label, get_service in (("build() per call", build_per_call),
+                               ("cached per thread", gdrive.get_drive_service)):
+        result = run(get_service, args.folder_id, args.files, args.workers)
+        print(f"{label:>18}: " + ", ".join(f"{k} {v:.2f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
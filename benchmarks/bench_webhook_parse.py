@@ -0,0 +1,129 @@
+"""
+Webhook ingestion throughput: signature check + parse + message walk.
+
+    old   hexdigest "!=" compare, stdlib json.loads of the whole body into
+          dicts (request.json()), entry/change/message dicts walked in Python
+    new   compare_digest, one msgspec decode into typed structs
+
+Recorded deliveries are raw request bodies, one file per delivery (*.json) in
+a directory or one body per line in a .jsonl file. Without --payloads a
+representative text-message delivery is used:
+
+    python benchmarks/bench_webhook_parse.py --payloads recorded/ --seconds 5
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from app.webhook_payload import decode_payload, extract_messages  # noqa: E402
+
+SECRET = b"benchmark-app-secret"
+
+SAMPLE = {
+    "object": "whatsapp_business_account",
+    "entry": [{
+        "id": "102290129340398",
+        "changes": [{
+            "field": "messages",
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                "contacts": [{"profile": {"name": "Kerry Fisher"}, "wa_id": "16315551234"}],
+                "messages": [{
+                    "from": "16315551234",
+                    "id": "wamid.ABGGFlCGg0cvAgo-sJQh43L5Pe4W",
+                    "timestamp": "1603059201",
+                    "text": {"body": "STATUSFLOW"},
+                    "type": "text",
+                }],
+            },
+        }],
+    }],
+}
+
+
+def load_payloads(path: str | None) -> list[bytes]:
+    if not path:
+        return [json.dumps(SAMPLE).encode()]
+    source = pathlib.Path(path)
+    if source.is_dir():
+        return [p.read_bytes() for p in sorted(source.glob("*.json"))]
+    return [line for line in source.read_bytes().splitlines() if line.strip()]
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET, body, hashlib.sha256).hexdigest()
+
+
+def old_ingest(body: bytes, signature: str) -> list:
+    expected = "sha256=" + hmac.new(SECRET, body, hashlib.sha256).hexdigest()
+    if signature != expected:
+        raise ValueError("bad signature")
+    data = json.loads(body)  # request.json()
+    events = []
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            contacts = value.get("contacts", [])
+            messages = value.get("messages", [])
+            if len(contacts) == len(messages) and contacts:
+                for contact, msg in zip(contacts, messages):
+                    events.append({
+                        "id": msg.get("id"),
+                        "from": msg.get("from"),
+                        "name": contact["profile"]["name"],
+                        "body": msg.get("text", {}).get("body", ""),
+                    })
+    return events
+
+
+def new_ingest(body: bytes, signature: str) -> list:
+    expected = "sha256=" + hmac.new(SECRET, body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
+        raise ValueError("bad signature")
+    return extract_messages(decode_payload(body))
+
+
+def measure(ingest, deliveries, seconds: float):
+    done, nbytes = 0, 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for body, signature in deliveries:
+            ingest(body, signature)
+            nbytes += len(body)
+        done += len(deliveries)
+    elapsed = time.perf_counter() - start
+    return done / elapsed, nbytes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", help="directory of *.json bodies or a .jsonl file")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    deliveries = [(body, sign(body)) for body in load_payloads(args.payloads)]
+    if not deliveries:
+        sys.exit("No payloads found")
+
+    # Both paths must agree on what they extract
+    for body, signature in deliveries:
+        assert old_ingest(body, signature) == new_ingest(body, signature)
+
+    print(f"{len(deliveries)} distinct deliveries, {sum(len(b) for b, _ in deliveries)} bytes")
+    results = {}
+    for name, ingest in (("old", old_ingest), ("new", new_ingest)):
+        rate, throughput = measure(ingest, deliveries, args.seconds)
+        results[name] = rate
+        print(f"{name}: {rate:10.0f} deliveries/s  {throughput / 1e6:7.1f} MB/s  {1e6 / rate:6.2f} us/delivery")
+    print(f"speedup: {results['new'] / results['old']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
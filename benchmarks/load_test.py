@@ -0,0 +1,69 @@
+"""
+Closed-loop HTTP load test for the StatusFlow API.
+
+Run it against a build with the sync routers and against one with the async
+routers, with the same --concurrency, and compare requests/sec and p99:
+
+    python benchmarks/load_test.py http://localhost:8000/status/+2348012345678 \
+        --concurrency 200 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, method: str, url: str, deadline: float,
+                 latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(url: str, method: str, concurrency: int, duration: float):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            worker(client, method, url, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print("No requests completed")
+        return
+
+    print(f"{method} {url}")
+    print(f"concurrency={concurrency} duration={elapsed:.1f}s requests={len(latencies)} errors={len(errors)}")
+    print(f"requests/sec: {len(latencies) / elapsed:.1f}")
+    print(f"latency p50: {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p99: {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"latency mean: {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.method.upper(), args.concurrency, args.duration))
@@ -0,0 +1,39 @@
+"""add status quota check to users
+
+Revision ID: 3c1f7a92d4e6
+Revises: 6ba059deb924
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a92d4e6'
+down_revision: Union[str, Sequence[str], None] = '6ba059deb924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Re-sync the counter with the real number of statuses before enforcing the range,
+    # earlier read-modify-write updates may have let it drift.
+    op.execute(
+        """
+        UPDATE users SET sequence = LEAST(
+            (SELECT count(*) FROM statuses WHERE statuses.user_id = users.id), 20
+        )
+        """
+    )
+    op.create_check_constraint(
+        'ck_users_sequence_quota', 'users', 'sequence >= 0 AND sequence <= 20'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_users_sequence_quota', 'users', type_='check')
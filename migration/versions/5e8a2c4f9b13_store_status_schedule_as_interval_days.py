@@ -0,0 +1,55 @@
+"""store status schedule as interval days
+
+Revision ID: 5e8a2c4f9b13
+Revises: d41e9b07c2a5
+Create Date: 2026-10-19 13:40:05.227914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a2c4f9b13'
+down_revision: Union[str, Sequence[str], None] = 'd41e9b07c2a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCHEDULE_DAYS = {
+    'Every Day': 1,
+    'Every 2 Days': 2,
+    'Every 3 Days': 3,
+    'Every 4 Days': 4,
+    'Every 5 Days': 5,
+    'Every 6 Days': 6,
+    'Every Week': 7,
+    'Every 10 Days': 10,
+    'Every 2 Weeks': 14,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cases = " ".join(f"WHEN '{label}' THEN {days}" for label, days in SCHEDULE_DAYS.items())
+    op.alter_column('statuses', 'schedule',
+               existing_type=sa.String(length=20),
+               type_=sa.SmallInteger(),
+               existing_nullable=False,
+               postgresql_using=f"CASE schedule {cases} ELSE 1 END")
+    op.create_check_constraint(
+        'ck_statuses_schedule_days', 'statuses',
+        f"schedule IN ({', '.join(str(days) for days in SCHEDULE_DAYS.values())})"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_statuses_schedule_days', 'statuses', type_='check')
+    cases = " ".join(f"WHEN {days} THEN '{label}'" for label, days in SCHEDULE_DAYS.items())
+    op.alter_column('statuses', 'schedule',
+               existing_type=sa.SmallInteger(),
+               type_=sa.String(length=20),
+               existing_nullable=False,
+               postgresql_using=f"CASE schedule {cases} ELSE 'Every Day' END")
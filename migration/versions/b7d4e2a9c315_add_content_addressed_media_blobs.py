@@ -0,0 +1,42 @@
+"""add content addressed media blobs
+
+Revision ID: b7d4e2a9c315
+Revises: 9f3b6d18e7a0
+Create Date: 2026-10-19 16:02:37.512840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e2a9c315'
+down_revision: Union[str, Sequence[str], None] = '9f3b6d18e7a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('media_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('file_id', sa.String(length=50), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('file_id'),
+    sa.UniqueConstraint('sha256')
+    )
+    # Existing statuses keep their per-user media file (media_sha256 stays NULL)
+    op.add_column('statuses', sa.Column('media_sha256', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_statuses_media_sha256'), 'statuses', ['media_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_statuses_media_sha256'), table_name='statuses')
+    op.drop_column('statuses', 'media_sha256')
+    op.drop_table('media_blobs')
@@ -0,0 +1,35 @@
+"""widen media_blobs file_id
+
+Revision ID: c8e5f3a1b926
+Revises: b7d4e2a9c315
+Create Date: 2026-10-19 18:41:05.230617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e5f3a1b926'
+down_revision: Union[str, Sequence[str], None] = 'b7d4e2a9c315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Local storage ids are root-relative paths, longer than Drive's file ids
+    op.alter_column('media_blobs', 'file_id',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('media_blobs', 'file_id',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=50),
+               existing_nullable=False)
@@ -0,0 +1,51 @@
+"""add scheduler indexes to statuses
+
+Revision ID: d41e9b07c2a5
+Revises: 3c1f7a92d4e6
+Create Date: 2026-10-19 11:02:17.564390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41e9b07c2a5'
+down_revision: Union[str, Sequence[str], None] = '3c1f7a92d4e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_statuses_pending_schedule_time', 'statuses', ['schedule_time'],
+            unique=False,
+            postgresql_where=sa.text('is_upload = false'),
+            postgresql_include=['user_id', 'created_at', 'schedule'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_statuses_uploaded', 'statuses', ['id'],
+            unique=False,
+            postgresql_where=sa.text('is_upload = true'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_statuses_user_id_images_path', 'statuses', ['user_id', 'images_path'],
+            unique=False,
+            postgresql_where=sa.text('is_text = false'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_statuses_user_id_images_path', table_name='statuses', postgresql_concurrently=True)
+        op.drop_index('ix_statuses_uploaded', table_name='statuses', postgresql_concurrently=True)
+        op.drop_index('ix_statuses_pending_schedule_time', table_name='statuses', postgresql_concurrently=True)